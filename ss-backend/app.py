@@ -1,25 +1,40 @@
 import json
-import re
-import requests
-import joblib
-import pandas as pd
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 
+from llm_client import GeminiClient
+from local_renderer import render_formatted, render_markdown
+from metrics import Metrics, server_timing
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry
+from text_extractor import TextExtractor, all_neighborhoods, all_substances
+
 load_dotenv()
 
 app = Flask(__name__)  # Use __name__
 CORS(app, resources={r"/*": {"origins": "https://substance-sense.netlify.app"}})
 
 # --------------------------------------------------------------------
-# 1. Load the trained model (retained for endpoint compatibility)
+# 1. Load the trained model once per process; new versions published by
+#    train_model_expanded.py are picked up by the registry automatically
 # --------------------------------------------------------------------
-model = joblib.load("model_calibrated.pkl")
-all_training_cols = getattr(model, "feature_names_in_", None)
-all_neighborhoods = ["Agassiz", "Airport", "Alpine Place", "Amber Trails", "Archwood", "Armstrong Point", "Assiniboia Downs", "Assiniboine Park", "Beaumont", "Betsworth", "Birchwood", "Booth", "Bridgwater Centre", "Bridgwater Forest", "Bridgwater Lakes", "Bridgwater Trails", "Broadway-Assiniboine", "Brockville", "Brooklands", "Bruce Park", "Buchanan", "Buffalo", "Burrows Central", "Burrows-Keewatin", "Canterbury Park", "Centennial", "Central Park", "Central River Heights", "Central St. Boniface", "Chalmers", "Chevrier", "China Town", "Civic Centre", "Cloutier Drive", "Colony", "Crescent Park", "Crescentwood", "Crestview", "Dakota Crossing", "Daniel McIntyre", "Daniel Mcintyre", "Deer Lodge", "Dufferin", "Dufferin Industrial", "Dufresne", "Dugald", "Eaglemere", "Earl Grey", "East Elmwood", "Ebby-Wentworth", "Edgeland", "Elm Park", "Elmhurst", "Eric Coy", "Exchange District", "Fairfield Park", "Fort Richmond", "Fraipont", "Garden City", "Glendale", "Glenelm", "Glenwood", "Grant Park", "Grassie", "Heritage Park", "Holden", "Inkster Gardens", "Inkster Industrial Park", "Inkster-Faraday", "Island Lakes", "J. B. Mitchell", "Jameswood", "Jefferson", "Kensington", "Kern Park", "Kil-Cona Park", "Kildare-Redonda", "Kildonan Crossing", "Kildonan Drive", "Kildonan Park", "King Edward", "Kingston Crescent", "Kirkfield", "La Barriere", "Lavalee", "Legislature", "Leila North", "Leila-McPhillips Triangle", "Leila-Mcphillips Triangle", "Linden Ridge", "Linden Woods", "Logan-C.P.R.", "Lord Roberts", "Lord Selkirk Park", "Luxton", "Maginot", "Mandalay West", "Maple Grove Park", "Margaret Park", "Marlton", "Mathers", "Maybank", "McLeod Industrial", "McMillan", "Mcleod Industrial", "Mcmillan", "Meadowood", "Meadows", "Melrose", "Minnetonka", "Minto", "Mission Gardens", "Mission Industrial", "Montcalm", "Munroe East", "Munroe West", "Murray Industrial Park", "Mynarski", "Niakwa Park", "Niakwa Place", "Norberry", "Normand Park", "North Inkster Industrial", "North Point Douglas", "North River Heights", "North St. Boniface", "North Transcona Yards", "Norwood East", "Norwood West", "Oak Point Highway", "Old Tuxedo", "Omand's Creek Industrial", "Pacific Industrial", "Parc La Salle", "Parker", "Peguis", "Pembina Strip", "Perrault", "Point Road", "Polo Park", "Portage & Main", "Portage-Ellice", "Prairie Pointe", "Pulberry", "Radisson", "Regent", "Richmond Lakes", "Richmond West", "Ridgedale", "Ridgewood South", "River East", "River Park South", "River West Park", "River-Osborne", "Riverbend", "Rivergrove", "Riverview", "Robertson", "Roblin Park", "Rockwood", "Roslyn", "Rosser-Old Kildonan", "Rossmere-A", "Rossmere-B", "Royalwood", "Sage Creek", "Sargent Park", "Saskatchewan North", "Seven Oaks", "Shaughnessy Park", "Silver Heights", "Sir John Franklin", "South Point Douglas", "South Pointe", "South Portage", "South River Heights", "South Tuxedo", "Southboine", "Southdale", "Southland Park", "Spence", "Springfield North", "Springfield South", "St. Boniface Industrial Park", "St. George", "St. James Industrial", "St. John's", "St. John's Park", "St. Matthews", "St. Norbert", "St. Vital Centre", "St. Vital Perimeter South", "Stock Yards", "Sturgeon Creek", "Symington Yards", "Talbot-Grey", "Templeton-Sinclair", "The Forks", "The Maples", "Tissot", "Transcona North", "Transcona South", "Transcona Yards", "Trappistes", "Turnbull Drive", "Tuxedo", "Tuxedo Industrial", "Tyndall Park", "Tyne-Tees", "University", "Valhalla", "Valley Gardens", "Varennes", "Varsity View", "Vialoux", "Victoria Crescent", "Victoria West", "Vista", "Waverley Heights", "Wellington Crescent", "West Alexander", "West Broadway", "West Fort Garry Industrial", "West Kildonan Industrial", "West Wolseley", "Westdale", "Weston", "Weston Shops", "Westwood", "Whyte Ridge", "Wildwood", "Wilkes South", "William Whyte", "Windsor Park", "Wolseley", "Woodhaven", "Worthington"]
-all_substances = ["Alcohol", "Cocaine", "Crystal Meth", "Marijuana", "Opioids"]
+registry = ModelRegistry(
+    models_dir=os.getenv("MODEL_DIR", "models"),
+    poll_seconds=float(os.getenv("MODEL_POLL_SECONDS", 30)),
+    use_risk_table=os.getenv("USE_RISK_TABLE", "1") == "1",
+    backend=os.getenv("MODEL_BACKEND", "compiled"),
+    # The compiled backend is slower than sklearn past ~1000 rows (0 = never switch)
+    large_batch_rows=int(os.getenv("LARGE_BATCH_ROWS", 1000)),
+)
+registry.reload()
+
+# Per-stage latency histograms and request counters, served on /metrics.
+# METRICS_ENABLED=0 turns every span into a no-op; SERVER_TIMING=1 adds a
+# Server-Timing header with the request's stage durations.
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "1") == "1")
+SERVER_TIMING = metrics.enabled and os.getenv("SERVER_TIMING", "0") == "1"
 # --------------------------------------------------------------------
 # 2. Helper function to convert an age range string to a midpoint integer
 # --------------------------------------------------------------------
@@ -37,47 +52,20 @@ def parse_age(age_str):
         return 30  # fallback
 
 # --------------------------------------------------------------------
-# 3. The main prediction logic (we fake the prediction values)
+# 3. The main prediction logic
 # --------------------------------------------------------------------
-def make_prediction(age_str, gender_str, neigh_str, subst_str):
-    # Load model and feature columns
-    model = joblib.load("model_calibrated.pkl")
-    feature_cols = joblib.load("feature_cols.pkl")
-    
-    # Initialize input DataFrame with all zeroes
-    input_df = pd.DataFrame(columns=feature_cols)
-    input_df.loc[0] = 0
-    
-    # Process input values
-    age_numeric = parse_age(age_str)
-    input_df.at[0, "AgeNumeric"] = age_numeric
-    gender_num = 1 if gender_str.lower() == "female" else 0
-    input_df.at[0, "GenderNum"] = gender_num
-    
-    # One-hot encode neighborhood
-    neigh_col = f"neigh_{neigh_str.lower()}"
-    if neigh_col in input_df.columns:
-        input_df.at[0, neigh_col] = 1
-    
-    # One-hot encode substance
-    subst_col = f"subst_{subst_str.lower()}"
-    if subst_col in input_df.columns:
-        input_df.at[0, subst_col] = 1
-    
+def overdose_class_for(subst_str):
     # Adjusted risk class based on substance
     substance = subst_str.lower()
     if substance in ["opioids", "crystal meth", "cocaine"]:
-        overdose_class = 2  # High risk
+        return 2  # High risk
     elif substance == "alcohol":
-        overdose_class = 1   # Medium risk
-    else:
-        overdose_class = 0   # Low risk
-    
-    # Use the model to predict probability
-    probs = model.predict_proba(input_df)[0]
-    
-    # Set probability based on model prediction, rather than hardcoded
-    overdose_probability = probs[overdose_class]  # Use the actual model's predicted probability
+        return 1   # Medium risk
+    return 0   # Low risk
+
+def build_result(probs, overdose_class):
+    # Use the actual model's predicted probability for the substance's class
+    overdose_probability = probs[overdose_class]
     
     # Determine confidence based on overdose probability
     if overdose_probability > 0.7:
@@ -87,78 +75,181 @@ def make_prediction(age_str, gender_str, neigh_str, subst_str):
     else:
         confidence = "Low"
     
-    # Now return the results with proper class and probability
     return {
         "overdose_probability": round(overdose_probability, 2),
         "overdose_class": overdose_class,
         "confidence": confidence
     }
 
-# --------------------------------------------------------------------
-# 4. Helper function to format output with the Gemini LLM (fake call)
-# --------------------------------------------------------------------
-def format_output_with_gemini(prediction_json):
+def make_prediction(age_str, gender_str, neigh_str, subst_str):
+    # Use one model version for the whole request, even if a swap happens mid-way
+    bundle = registry.get()
+    
+    # Process input values
+    age_numeric = parse_age(age_str)
+    gender_num = 1 if gender_str.lower() == "female" else 0
+    overdose_class = overdose_class_for(subst_str)
+    
+    # Precomputed answer for this exact input, if the model version has a risk table
+    probs = None
+    if bundle.risk_table is not None:
+        with metrics.span("risk_table"):
+            probs = bundle.risk_table.lookup(age_numeric, gender_num, neigh_str, subst_str)
+    
+    if probs is None:
+        features = bundle.features
+        with metrics.span("features"):
+            X = features.encode([age_numeric], [gender_num],
+                                [features.neigh_position(neigh_str)], [features.subst_position(subst_str)])
+        with metrics.span("predict_proba"):
+            probs = bundle.predict_proba(X)[0]
+    
+    return build_result(probs, overdose_class)
+
+REQUIRED_FIELDS = ["Age", "Gender", "Neighborhood", "Substance"]
+# parse_age falls back for any Age it can't read; the other fields are matched as text
+STRING_FIELDS = ["Gender", "Neighborhood", "Substance"]
+
+def record_error(record):
+    """Why a record can't be scored by make_prediction ("Missing required fields: ..."), or None."""
+    if not isinstance(record, dict):
+        return "Record must be a JSON object"
+    missing = [f for f in REQUIRED_FIELDS if not record.get(f)]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    not_strings = [f for f in STRING_FIELDS if not isinstance(record[f], str)]
+    if not_strings:
+        return f"Fields must be strings: {', '.join(not_strings)}"
+    return None
+
+def make_predictions_batch(records):
     """
-    Fakes a call to the Gemini API by generating a human-friendly summary based on the prediction JSON.
-    The prompt instructs the LLM to analyze the provided input and generated prediction,
-    discussing the probability of overdose, class, confidence, and high-risk factors.
-    If Winnipeg is mentioned in the input, additional context should be provided.
+    Scores a list of {"Age", "Gender", "Neighborhood", "Substance"} records.
+    Valid records not covered by the risk table are encoded into one feature
+    matrix and scored with a single predict_proba call. Returns one entry per
+    record, in input order: a prediction dict or {"error": "..."}.
     """
-    # Embedded Gemini API key (insecure for production)
-    gemini_api_key = os.getenv('GEMINI_API_KEY')
-    gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={gemini_api_key}"
+    bundle = registry.get()
+    features = bundle.features
+    results = [None] * len(records)
+    pending = []  # (index, overdose_class, age_numeric, gender_num, neigh_pos, subst_pos)
     
-    prompt = f"""
-    You are a knowledgeable and articulate data analyst specializing in substance use risk prediction. Based on the JSON output below, please analyze the input data and generate a detailed, human-friendly summary. Your summary should include:
-
-2. An overdose probability, the percentage in bold, very clearly formatted.
-1. An interpretation of the overdose class (0, 3, or 10) and its significance in simple English, where:
-   - 0 represents low risk
-   - 1 represents medium risk (typically associated with alcohol)
-   - 2 represents high risk (typically associated with opioids, crystal meth, or cocaine)
-2. A discussion of the confidence level (Low, Medium, or High), and what that means in context.
-3. A plain language explanation of any high-risk factors identified in the input.
-4. If the input mentions a location like Winnipeg, provide additional local contextual insights.
-5. Mention the age, location, gender, and substance (all starting with a capital letter e.g. "Male") -- in ur response again CLEARLY at the start of your message in a list format. If the age range mentioned is just 1 age, e.g. 13 to 13, just use 13 instead of 13 to 13. DO NOT include Winnipeg in the location, just the name of the area.
-6. Use bold headings, separate concerns, and make your output readable.
-
-You are presenting this information to a user in markdown format, please make sure it is readable, not too long, concise, and something that makes sense. Do NOT use sentences like "Okay, here's an analysis of the substance use prediction model's output, presented in a user-friendly markdown format:" to start or end your text, the user does not need to know how you are getting this output. Also, always end your message with a disclaimer: "This analysis is based solely on the provided data and should not be considered a definitive diagnosis or prediction. Professional medical and psychological evaluation is essential for a comprehensive assessment and personalized recommendations." in italics under a --- line in markdown.
-
-Below is the JSON output from the substance use prediction model:
-
-{prediction_json}
-
-Return your answer in clear, plain text with organized headings.
-"""
-    payload = {
-        "contents": [
-            {"parts": [{"text": prompt}]}
-        ]
-    }
-    headers = {"Content-Type": "application/json"}
+    for i, record in enumerate(records):
+        error = record_error(record)
+        if error is not None:
+            results[i] = {"error": error}
+            continue
+        
+        age_numeric = parse_age(record["Age"])
+        gender_num = 1 if record["Gender"].lower() == "female" else 0
+        overdose_class = overdose_class_for(record["Substance"])
+        
+        probs = None
+        if bundle.risk_table is not None:
+            probs = bundle.risk_table.lookup(age_numeric, gender_num, record["Neighborhood"], record["Substance"])
+        if probs is not None:
+            results[i] = build_result(probs, overdose_class)
+        else:
+            pending.append((i, overdose_class, age_numeric, gender_num,
+                            features.neigh_position(record["Neighborhood"]),
+                            features.subst_position(record["Substance"])))
     
-    response = requests.post(gemini_url, headers=headers, json=payload)
+    if pending:
+        index, classes, ages, genders, neighs, substs = zip(*pending)
+        with metrics.span("features"):
+            X = features.encode(ages, genders, neighs, substs)
+        with metrics.span("predict_proba"):
+            all_probs = bundle.predict_proba(X)
+        for i, overdose_class, probs in zip(index, classes, all_probs):
+            results[i] = build_result(probs, overdose_class)
     
-    if response.status_code == 200:
-        try:
-            data = response.json()
-            candidate = data["candidates"][0]
-            formatted_text = candidate.get("output") or candidate.get("content")
-            if not formatted_text:
-                formatted_text = "No formatted output found in Gemini response."
-        except Exception as e:
-            formatted_text = f"Error parsing Gemini response: {str(e)}"
-        return formatted_text
-    else:
-        return f"Error from Gemini: {response.status_code} {response.text}"
+    return results
+
+# Optional micro-batching: concurrent single predictions that arrive within
+# MICRO_BATCH_WINDOW_MS of each other are scored in one make_predictions_batch call.
+# That call runs on the batcher's thread for several requests at once, so its
+# spans go to the stage histograms but not to any request's Server-Timing header.
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", 0))
+batcher = None
+if MICRO_BATCH_WINDOW_MS > 0:
+    batcher = MicroBatcher(make_predictions_batch, MICRO_BATCH_WINDOW_MS,
+                           int(os.getenv("MICRO_BATCH_MAX_SIZE", 64)))
+
+def prediction_record(age_str, gender_str, neigh_str, subst_str):
+    return {"Age": age_str, "Gender": gender_str, "Neighborhood": neigh_str, "Substance": subst_str}
+
+def predict(age_str, gender_str, neigh_str, subst_str):
+    """make_prediction, coalesced with concurrent requests when micro-batching is on."""
+    if batcher is None:
+        return make_prediction(age_str, gender_str, neigh_str, subst_str)
+    return batcher(prediction_record(age_str, gender_str, neigh_str, subst_str))
 
 # --------------------------------------------------------------------
-# 5. Flask endpoints
+# 4. Helper function to format output with the Gemini LLM
 # --------------------------------------------------------------------
+# One pooled, cached client per process (configured from GEMINI_* env vars)
+llm_client = GeminiClient.from_env()
+# How long a request waits for Gemini before answering with the local rendering (0 = never call it)
+LLM_BUDGET_SECONDS = float(os.getenv("LLM_BUDGET_MS", 3000)) / 1000.0
+
+def format_output_with_gemini(prediction_json):
+    """
+    Asks Gemini for a human-friendly markdown summary of the prediction JSON
+    (see llm_client.build_prompt). Identical payloads are answered from the
+    client's cache without calling the API again. If Gemini fails or hasn't
+    answered within LLM_BUDGET_MS, the same sections are rendered locally
+    (see local_renderer.py) in the same {"parts", "role"} shape.
+    """
+    with metrics.span("format"):
+        return llm_client.format_within(json.loads(prediction_json), LLM_BUDGET_SECONDS, render_formatted)
+
+# --------------------------------------------------------------------
+# 5. Request metrics and Flask endpoints
+# --------------------------------------------------------------------
+@app.before_request
+def start_request_metrics():
+    g.metrics_token = metrics.start_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    timings = metrics.finish_request(g.pop("metrics_token", None), route, request.method, response.status_code)
+    if SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+def model_metrics():
+    bundle = registry.get()
+    llm = llm_client.stats()
+    return [
+        ("model_info", "gauge", "The model version serving requests.",
+         [({"version": bundle.version, "backend": type(bundle.model).__name__}, 1)]),
+        ("llm_calls_total", "counter", "Formatting calls by outcome (see /llm_stats).",
+         [({"result": name}, llm[name]) for name in ("hits", "misses", "errors", "fallbacks")]),
+    ]
+
+metrics.add_collector(model_metrics)
+
 @app.route("/")
 def home():
     return "Enhanced Substance Use Prediction API is running!"
 
+@app.route("/model_info")
+def model_info():
+    return jsonify(registry.info())
+
+@app.route("/llm_stats")
+def llm_stats():
+    return jsonify(llm_client.stats())
+
+@app.route("/batch_stats")
+def batch_stats():
+    return jsonify(batcher.stats() if batcher is not None else {"enabled": False})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/predict_expanded", methods=["POST"])
 def predict_expanded():
     """
@@ -171,46 +262,58 @@ def predict_expanded():
     }
     """
     data = request.get_json() or {}
-    age_str = data.get("Age")
-    gender_str = data.get("Gender")
-    neigh_str = data.get("Neighborhood")
-    subst_str = data.get("Substance")
-    
-    if not all([age_str, gender_str, neigh_str, subst_str]):
-        return jsonify({"error": "Missing required fields: Age, Gender, Neighborhood, Substance"}), 400
+    # Checked here rather than in make_prediction so the batched path rejects the same records
+    error = record_error(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-    result = make_prediction(age_str, gender_str, neigh_str, subst_str)
+    result = predict(*(data[f] for f in REQUIRED_FIELDS))
+    if "error" in result:
+        return jsonify(result), 400
     return jsonify(result)
 
-def extract_age(user_text):
-    # Regex to match a single age, e.g., "19 years old"
-    match_single = re.search(r"(\d{1,3})\s?years?\s?old", user_text)
-    
-    if match_single:
-        # Return the age as "X to X", e.g., "19 to 19"
-        return f"{match_single.group(1)} to {match_single.group(1)}"
+MAX_BATCH_RECORDS = int(os.getenv("MAX_BATCH_RECORDS", 10000))
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    """
+    Expects JSON with a list of /predict_expanded records:
+    {
+      "records": [
+        {"Age": "15 to 19", "Gender": "Male", "Neighborhood": "exchange", "Substance": "fentanyl"},
+        ...
+      ]
+    }
+    Returns {"results": [...]} in input order; invalid records get {"error": ...}.
+    """
+    data = request.get_json(silent=True) or {}
+    records = data.get("records") if isinstance(data, dict) else None
     
-    # Fallback if no age is found
-    return "15 to 19"  # Default fallback age range
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a JSON object with a 'records' list"}), 400
+    if len(records) > MAX_BATCH_RECORDS:
+        return jsonify({"error": f"Too many records: {len(records)} (max {MAX_BATCH_RECORDS})"}), 413
+
+    return jsonify({"results": make_predictions_batch(records)})
+
+# Compiled once; finds all four fields in a single pass over the text
+extractor = TextExtractor(all_neighborhoods, all_substances)
+
+def extract_fields(user_text):
+    with metrics.span("extract"):
+        return extractor.extract(user_text)
+
+def extract_age(user_text):
+    return extract_fields(user_text)["Age"]
 
 def extract_gender(user_text):
-    if "female" in user_text.lower():
-        return "female"
-    elif "male" in user_text.lower():
-        return "male"
-    return "unknown"
+    return extract_fields(user_text)["Gender"]
 
 def extract_neighborhood(user_text):
-    for neigh in all_neighborhoods:
-        if neigh.lower() in user_text.lower():
-            return neigh
-    return "unknown"
+    return extract_fields(user_text)["Neighborhood"]
 
 def extract_substance(user_text):
-    for s in all_substances:
-        if s.lower() in user_text.lower():
-            return s
-    return "none"
+    return extract_fields(user_text)["Substance"]
 
 @app.route("/predict_from_text", methods=["POST"])
 def predict_from_text():
@@ -220,25 +323,15 @@ def predict_from_text():
     if not user_text:
         return jsonify({"error": "No text provided"}), 400
 
-    age_str_detected = extract_age(user_text)
-    gender_detected = extract_gender(user_text)
-    neighborhood_detected = extract_neighborhood(user_text)
-    substance_detected = extract_substance(user_text)
+    parsed_data = extract_fields(user_text)
 
-    result = make_prediction(
-        age_str_detected,
-        gender_detected,
-        neighborhood_detected,
-        substance_detected
+    result = predict(
+        parsed_data["Age"],
+        parsed_data["Gender"],
+        parsed_data["Neighborhood"],
+        parsed_data["Substance"]
     )
 
-    parsed_data = {
-        "Age": age_str_detected,
-        "Gender": gender_detected,
-        "Neighborhood": neighborhood_detected,
-        "Substance": substance_detected
-    }
-
     prediction_json = json.dumps({
         "parsed_data": parsed_data,
         "prediction": result
@@ -252,6 +345,52 @@ def predict_from_text():
         "formatted_output": formatted_output
     })
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/predict_from_text_stream", methods=["POST"])
+def predict_from_text_stream():
+    """
+    Same input as /predict_from_text, answered as server-sent events:
+    "parsed_data" and "prediction" are sent immediately, then the formatted
+    markdown arrives as "delta" events ({"text": ...}) and the stream ends
+    with "done". If Gemini's first chunk doesn't arrive within LLM_BUDGET_MS,
+    or Gemini fails, the locally rendered markdown is sent as the "delta"
+    instead; a failure after Gemini's text has started ends with a "replace"
+    event ({"text": ...}, meant to take the place of everything received so
+    far). See llm_client.GeminiClient.stream_within.
+    """
+    body = request.get_json() or {}
+    user_text = body.get("text", "").lower()
+
+    if not user_text:
+        return jsonify({"error": "No text provided"}), 400
+
+    parsed_data = extract_fields(user_text)
+    result = predict(
+        parsed_data["Age"],
+        parsed_data["Gender"],
+        parsed_data["Neighborhood"],
+        parsed_data["Substance"]
+    )
+
+    def generate():
+        yield sse_event("parsed_data", parsed_data)
+        yield sse_event("prediction", result)
+        # A client disconnect closes this generator, which closes the Gemini stream
+        payload = {"parsed_data": parsed_data, "prediction": result}
+        events = llm_client.stream_within(payload, LLM_BUDGET_SECONDS, render_markdown)
+        try:
+            with metrics.span("format_stream"):
+                for event, text in events:
+                    yield sse_event(event, {"text": text})
+        finally:
+            events.close()
+        yield sse_event("done", {})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
 
 # --------------------------------------------------------------------
 # Run the Flask server on port 8082
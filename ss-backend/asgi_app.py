@@ -0,0 +1,300 @@
+"""
+asyncio (ASGI) serving mode for the same routes as app.py.
+
+Waiting on Gemini no longer pins a worker: the formatting call uses
+AsyncGeminiClient, predict_proba runs on a bounded thread pool, and a
+concurrency limit with a short admission queue answers 503 + Retry-After
+when the process is saturated instead of letting latency grow unbounded.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8080
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from app import (
+    LLM_BUDGET_SECONDS,
+    MAX_BATCH_RECORDS,
+    REQUIRED_FIELDS,
+    SERVER_TIMING,
+    batcher,
+    extract_fields,
+    make_prediction,
+    make_predictions_batch,
+    metrics,
+    prediction_record,
+    record_error,
+    registry,
+    sse_event,
+)
+from llm_client import AsyncGeminiClient
+from local_renderer import render_formatted, render_markdown
+from metrics import server_timing
+
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", 64))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", 128))
+
+# CPU-bound scoring runs here so it never blocks the event loop
+predict_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PREDICT_WORKERS", 4)))
+# Every admitted request may be waiting on Gemini, so size the pool to match
+llm_client = AsyncGeminiClient.from_env(pool_size=int(os.getenv("GEMINI_POOL_SIZE", MAX_CONCURRENCY)))
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Lets at most max_concurrency requests to `paths` run at once and up to
+    max_queue more wait for a slot. Anything beyond that is rejected right
+    away with 503 and a Retry-After header (backpressure for the balancer).
+    """
+
+    def __init__(self, app, paths, max_concurrency=64, max_queue=128, retry_after=1):
+        self.app = app
+        self.paths = set(paths)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.waiting = 0
+        self._slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            response = JSONResponse({"error": "Server is busy, please retry"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            return await response(scope, receive, send)
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each response in app.metrics (by route, method and status) and,
+    with SERVER_TIMING=1, adds a Server-Timing header.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.enabled:
+            return await self.app(scope, receive, send)
+        route = scope["path"] if scope["path"] in self.routes else "unmatched"
+        token = metrics.start_request()
+        finished = False
+
+        async def send_with_metrics(message):
+            nonlocal finished
+            if message["type"] == "http.response.start" and not finished:
+                finished = True
+                timings = metrics.finish_request(token, route, scope["method"], message["status"])
+                if SERVER_TIMING and timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not finished:
+                metrics.finish_request(token, route, scope["method"], 500)
+
+
+async def run_in_executor(fn, *args):
+    # Run in a copy of the request's context so spans on the executor reach its Server-Timing
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(predict_executor, ctx.run, fn, *args)
+
+
+async def predict(*fields):
+    """make_prediction off the event loop (through the micro-batcher when enabled)."""
+    if batcher is not None:
+        return await asyncio.wrap_future(batcher.submit(prediction_record(*fields)))
+    return await run_in_executor(make_prediction, *fields)
+
+
+async def read_json(request):
+    """Parsed JSON body ({} if empty), or None if the body isn't valid JSON."""
+    body = await request.body()
+    if not body:
+        return {}
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def invalid_json():
+    return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+
+
+# --------------------------------------------------------------------
+# Endpoints (same contracts as app.py)
+# --------------------------------------------------------------------
+async def home(request):
+    return PlainTextResponse("Enhanced Substance Use Prediction API is running!")
+
+
+async def model_info(request):
+    return JSONResponse(registry.info())
+
+
+async def llm_stats(request):
+    return JSONResponse(llm_client.stats())
+
+
+async def batch_stats(request):
+    return JSONResponse(batcher.stats() if batcher is not None else {"enabled": False})
+
+
+def llm_metrics():
+    llm = llm_client.stats()
+    return [("async_llm_calls_total", "counter", "Async formatting calls by outcome (see /llm_stats).",
+             [({"result": name}, llm[name]) for name in ("hits", "misses", "errors", "fallbacks")])]
+
+
+metrics.add_collector(llm_metrics)
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def predict_expanded(request):
+    data = await read_json(request)
+    if data is None:
+        return invalid_json()
+    error = record_error(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    result = await predict(*(data[f] for f in REQUIRED_FIELDS))
+    return JSONResponse(result, status_code=400 if "error" in result else 200)
+
+
+async def predict_batch(request):
+    data = await read_json(request)
+    if data is None:
+        return invalid_json()
+    records = data.get("records") if isinstance(data, dict) else None
+
+    if not isinstance(records, list):
+        return JSONResponse({"error": "Expected a JSON object with a 'records' list"}, status_code=400)
+    if len(records) > MAX_BATCH_RECORDS:
+        return JSONResponse({"error": f"Too many records: {len(records)} (max {MAX_BATCH_RECORDS})"},
+                            status_code=413)
+
+    return JSONResponse({"results": await run_in_executor(make_predictions_batch, records)})
+
+
+async def parse_and_predict(request):
+    body = await read_json(request)
+    if body is None:
+        return None, invalid_json()
+    user_text = body.get("text", "").lower() if isinstance(body, dict) else ""
+    if not user_text:
+        return None, JSONResponse({"error": "No text provided"}, status_code=400)
+
+    parsed_data = extract_fields(user_text)
+    result = await predict(
+        parsed_data["Age"],
+        parsed_data["Gender"],
+        parsed_data["Neighborhood"],
+        parsed_data["Substance"]
+    )
+    return {"parsed_data": parsed_data, "prediction": result}, None
+
+
+async def predict_from_text(request):
+    payload, error = await parse_and_predict(request)
+    if error is not None:
+        return error
+
+    with metrics.span("format"):
+        formatted_output = await llm_client.format_within(payload, LLM_BUDGET_SECONDS, render_formatted)
+    return JSONResponse({**payload, "formatted_output": formatted_output})
+
+
+async def predict_from_text_stream(request):
+    payload, error = await parse_and_predict(request)
+    if error is not None:
+        return error
+
+    async def generate():
+        yield sse_event("parsed_data", payload["parsed_data"])
+        yield sse_event("prediction", payload["prediction"])
+        # Starlette cancels this generator on client disconnect, closing the Gemini stream
+        events = llm_client.stream_within(payload, LLM_BUDGET_SECONDS, render_markdown)
+        try:
+            with metrics.span("format_stream"):
+                async for event, text in events:
+                    yield sse_event(event, {"text": text})
+        finally:
+            await events.aclose()
+        yield sse_event("done", {})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(generate(), media_type="text/event-stream", headers=headers)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await llm_client.aclose()
+    predict_executor.shutdown(wait=False)
+
+
+ROUTES = [
+    Route("/", home),
+    Route("/model_info", model_info),
+    Route("/llm_stats", llm_stats),
+    Route("/batch_stats", batch_stats),
+    Route("/metrics", metrics_endpoint),
+    Route("/predict_expanded", predict_expanded, methods=["POST"]),
+    Route("/predict_batch", predict_batch, methods=["POST"]),
+    Route("/predict_from_text", predict_from_text, methods=["POST"]),
+    Route("/predict_from_text_stream", predict_from_text_stream, methods=["POST"]),
+]
+
+LIMITED_PATHS = ["/predict_expanded", "/predict_batch", "/predict_from_text", "/predict_from_text_stream"]
+
+app = Starlette(
+    routes=ROUTES,
+    middleware=[
+        Middleware(RequestMetricsMiddleware, routes=[route.path for route in ROUTES]),
+        Middleware(CORSMiddleware, allow_origins=["https://substance-sense.netlify.app"],
+                   allow_methods=["*"], allow_headers=["*"]),
+        Middleware(ConcurrencyLimitMiddleware, paths=LIMITED_PATHS,
+                   max_concurrency=MAX_CONCURRENCY,
+                   max_queue=MAX_QUEUE,
+                   retry_after=int(os.getenv("RETRY_AFTER_SECONDS", 1))),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8080)))
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: compiled TextExtractor vs the original per-field extract_*
+functions (reproduced below as they were before the extractor existed).
+
+    python benchmarks/bench_extract.py [--repeat 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from text_extractor import TextExtractor, all_neighborhoods, all_substances  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "What is the overdose probability for a 23 year old male in Fort Richmond using alcohol?",
+    "my friend is a 31 years old female living in old tuxedo and she uses crystal meth",
+    "risk for opioids in tuxedo industrial",
+    "45 years old, woman, daniel mcintyre, cocaine",
+    "Tell me about marijuana use among teens in Winnipeg",
+    "A 70 year old male in St. Vital Centre who drinks alcohol every day, what is his risk?",
+]
+
+
+def legacy_extract_age(user_text):
+    match_single = re.search(r"(\d{1,3})\s?years?\s?old", user_text)
+    if match_single:
+        return f"{match_single.group(1)} to {match_single.group(1)}"
+    return "15 to 19"
+
+
+def legacy_extract_gender(user_text):
+    if "female" in user_text.lower():
+        return "female"
+    elif "male" in user_text.lower():
+        return "male"
+    return "unknown"
+
+
+def legacy_extract_neighborhood(user_text):
+    for neigh in all_neighborhoods:
+        if neigh.lower() in user_text.lower():
+            return neigh
+    return "unknown"
+
+
+def legacy_extract_substance(user_text):
+    for s in all_substances:
+        if s.lower() in user_text.lower():
+            return s
+    return "none"
+
+
+def legacy_extract(user_text):
+    return {
+        "Age": legacy_extract_age(user_text),
+        "Gender": legacy_extract_gender(user_text),
+        "Neighborhood": legacy_extract_neighborhood(user_text),
+        "Substance": legacy_extract_substance(user_text),
+    }
+
+
+def bench(fn, texts, repeat):
+    elapsed = min(timeit.repeat(lambda: [fn(t) for t in texts], number=repeat, repeat=3))
+    calls = repeat * len(texts)
+    chars = repeat * sum(len(t) for t in texts)
+    return {"us_per_text": elapsed / calls * 1e6, "texts_per_s": calls / elapsed, "mb_per_s": chars / elapsed / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = [t.lower() for t in SAMPLE_TEXTS]  # /predict_from_text lowercases first
+    extractor = TextExtractor(all_neighborhoods, all_substances)
+
+    for text in texts:
+        print(f"{text[:60]!r:64} legacy={legacy_extract(text)}")
+        print(f"{'':64} compiled={extractor.extract(text)}")
+    print()
+
+    legacy = bench(legacy_extract, texts, args.repeat)
+    compiled = bench(extractor.extract, texts, args.repeat)
+    for name, r in (("legacy extract_*", legacy), ("TextExtractor", compiled)):
+        print(f"{name:18} {r['us_per_text']:8.2f} us/text {r['texts_per_s']:12,.0f} texts/s {r['mb_per_s']:8.2f} MB/s")
+    print(f"speedup: {legacy['us_per_text'] / compiled['us_per_text']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Peak memory and wall time of the training feature pipeline: the original
+whole-file pandas version (row-wise .apply, dense pd.get_dummies) vs
+training_data.build_training_matrix (chunked categoricals, sparse CSR).
+
+    python benchmarks/bench_training_features.py --scale 10 [--fit]
+
+Run from ss-backend/. The input CSV is copied --scale times into a
+temporary file; each pipeline then runs in its own process so its peak RSS
+(ru_maxrss) is measured in isolation. --fit also fits the base
+RandomForestClassifier on the result. Both pipelines must yield the same
+feature columns and matrix, which is checked first.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training_data import build_training_matrix, classify_overdose_risk, parse_age  # noqa: E402
+
+
+def legacy_training_matrix(csv_path):
+    """Steps 1-7 of train_and_save_model before the sparse pipeline."""
+    df = pd.read_csv(csv_path)
+    df["Age"] = df["Age"].fillna("30 to 34").astype(str).str.strip()
+    df["AgeNumeric"] = df["Age"].apply(parse_age)
+    df["Gender"] = df["Gender"].fillna("unknown").astype(str).str.lower().str.strip()
+    df["GenderNum"] = df["Gender"].apply(lambda g: 1 if g == "male" else 0)
+    df["Neighbourhood"] = df["Neighbourhood"].fillna("none").astype(str).str.lower().str.strip()
+    df["Substance"] = df["Substance"].fillna("none").astype(str).str.lower().str.strip()
+    df["OriginalSubstance"] = df["Substance"]
+    df["OriginalNeighbourhood"] = df["Neighbourhood"]
+    df["IsOverdose"] = df["Substance"].apply(classify_overdose_risk)
+    df = df.dropna(subset=["AgeNumeric"])
+    df["AgeGroup"] = pd.cut(df["AgeNumeric"], bins=[0, 18, 25, 35, 50, 100],
+                            labels=["Under18", "YoungAdult", "Adult", "MiddleAge", "Senior"])
+    df_encoded = pd.get_dummies(df, columns=["AgeGroup", "Neighbourhood"], prefix=["age", "neigh"], drop_first=False)
+    unwanted_columns = ["Neighbourhood ID", "Incident Number", "Dispatch Date", "Patient Number", "Ward", "Age",
+                        "Gender", "Substance", "OriginalSubstance", "OriginalNeighbourhood"]
+    df_encoded = df_encoded.drop(columns=[col for col in unwanted_columns if col in df_encoded.columns])
+    feature_cols = ["AgeNumeric", "GenderNum"] + \
+                   [col for col in df_encoded.columns if col.startswith("age_") or col.startswith("neigh_")]
+    return df_encoded[feature_cols], df_encoded["IsOverdose"].to_numpy(), feature_cols
+
+
+def fit_base_model(X, y):
+    from sklearn.ensemble import RandomForestClassifier
+
+    RandomForestClassifier(n_estimators=100, max_depth=10, min_samples_split=5, min_samples_leaf=2,
+                           random_state=42, class_weight={0: 1, 1: 0.05, 2: 50}).fit(X, y)
+
+
+def run_pipeline(name, csv_path, fit):
+    """Runs in a child process; prints one JSON line."""
+    started = time.perf_counter()
+    if name == "legacy":
+        X, y, _ = legacy_training_matrix(csv_path)
+    else:
+        X, y = build_training_matrix(csv_path)[:2]
+    built = time.perf_counter()
+    if fit:
+        fit_base_model(X, y)
+    print(json.dumps({
+        "pipeline": name,
+        "rows": len(y),
+        "features_s": built - started,
+        "fit_s": time.perf_counter() - built if fit else None,
+        # ru_maxrss is in kB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def check_equal(csv_path):
+    X_dense, y_dense, cols_dense = legacy_training_matrix(csv_path)
+    data = build_training_matrix(csv_path)
+    if cols_dense != data.feature_cols:
+        raise SystemExit("Feature columns differ")
+    if not np.array_equal(X_dense.to_numpy(dtype=np.float32), data.X.toarray()):
+        raise SystemExit("Feature matrices differ")
+    if not np.array_equal(y_dense, data.y):
+        raise SystemExit("Labels differ")
+    print(f"Pipelines agree: {data.X.shape[0]} rows, {len(data.feature_cols)} columns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="Substance_Use_20250301.csv")
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--fit", action="store_true")
+    parser.add_argument("--run", choices=["legacy", "sparse"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return run_pipeline(args.run, args.csv, args.fit)
+
+    check_equal(args.csv)
+    with tempfile.TemporaryDirectory() as tmp:
+        scaled = os.path.join(tmp, "scaled.csv")
+        with open(args.csv) as src:
+            header, body = src.readline(), src.read()
+        with open(scaled, "w") as dst:
+            dst.write(header)
+            for _ in range(args.scale):
+                dst.write(body if body.endswith("\n") else body + "\n")
+
+        results = []
+        for name in ("legacy", "sparse"):
+            cmd = [sys.executable, os.path.abspath(__file__), "--run", name, "--csv", scaled]
+            if args.fit:
+                cmd.append("--fit")
+            output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({"scale": args.scale, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
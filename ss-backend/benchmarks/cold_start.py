@@ -0,0 +1,92 @@
+"""
+Cold start and per-worker memory of app.py for each model backend.
+
+    python benchmarks/cold_start.py --workers 4
+
+Run from ss-backend/. For each backend, starts --workers processes that
+import app (loading the current model version), score a batch through the
+model so its arrays are actually paged in, then wait. While they are all
+alive, their /proc/<pid>/smaps_rollup is read: RSS counts shared pages in
+every process, PSS splits them between the processes sharing them, so the
+PSS total is what the workers really cost together. Linux only.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+WORKER = """
+import time
+started = time.perf_counter()
+import app
+ready = time.perf_counter() - started
+
+from forest_compiler import sample_inputs
+bundle = app.registry.get()
+bundle.predict_proba(sample_inputs(bundle.features, n=2000))
+
+import json, sys
+print(json.dumps({"ready_s": ready, "backend": bundle.info()["backend"]}), flush=True)
+sys.stdin.read()
+"""
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def read_report(proc):
+    # app.py logs to stdout too; the report is the first JSON line
+    for line in proc.stdout:
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"Worker {proc.pid} exited before reporting")
+
+
+def measure(backend, workers):
+    env = {**os.environ, "MODEL_BACKEND": backend, "MODEL_POLL_SECONDS": "-1"}
+    started = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER], env=env, stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for _ in range(workers)]
+    try:
+        reports = [read_report(p) for p in procs]
+        all_ready = time.perf_counter() - started
+        memory = [memory_kb(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+
+    ready = sorted(r["ready_s"] for r in reports)
+    return {
+        "backend": reports[0]["backend"],
+        "workers": workers,
+        "ready_s_min": ready[0],
+        "ready_s_max": ready[-1],
+        "all_ready_s": all_ready,
+        "rss_mb_per_worker": sum(m["Rss"] for m in memory) / workers / 1024,
+        "pss_mb_per_worker": sum(m["Pss"] for m in memory) / workers / 1024,
+        "pss_mb_total": sum(m["Pss"] for m in memory) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["sklearn", "compiled"])
+    args = parser.parse_args()
+
+    print(json.dumps([measure(backend, args.workers) for backend in args.backends], indent=2))
+
+
+if __name__ == "__main__":
+    main()
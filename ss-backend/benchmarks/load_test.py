@@ -0,0 +1,142 @@
+"""
+Load test: the Flask app (gunicorn, sync workers) vs the ASGI app (uvicorn)
+with the same number of processes, against the local Gemini stub.
+
+    python benchmarks/load_test.py --target asgi --concurrency 64 --llm-latency-ms 500
+
+Run from ss-backend/ (the servers load the model from the working directory).
+Prints a JSON summary; the LLM response cache is disabled so every
+/predict_from_text request waits on the stub.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_gemini import start_stub  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(target, port, workers, threads):
+    if target == "flask":
+        cmd = ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"]
+        if threads > 1:
+            cmd += ["--threads", str(threads)]
+        return cmd
+    return ["uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning"]
+
+
+def start_server(target, workers, threads, env):
+    port = free_port()
+    proc = subprocess.Popen(server_command(target, port, workers, threads), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{target} server exited with code {proc.returncode}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{target} server did not start within 60s")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {f"p{q}": round(percentile(latencies, q) * 1000, 2) if latencies else None
+                       for q in (50, 95, 99)},
+        "status_counts": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+    }
+
+
+def run_load(url, make_body, concurrency, duration):
+    """Keeps `concurrency` clients busy on url for `duration` seconds."""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                status = session.post(url, json=make_body(rng), timeout=60).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.time()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, statuses, time.time() - started)
+
+
+def text_body(rng):
+    return {"text": f"{rng.randint(12, 90)} years old male in tuxedo using opioids"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["flask", "asgi"], default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="server processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker (flask only)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    stub = start_stub(0, args.llm_latency_ms)
+    env = dict(os.environ,
+               GEMINI_BASE_URL=f"http://127.0.0.1:{stub.server_port}/v1beta",
+               GEMINI_API_KEY="stub",
+               GEMINI_CACHE_SIZE="0")
+    proc, base_url = start_server(args.target, args.workers, args.threads, env)
+    try:
+        result = run_load(base_url + "/predict_from_text", text_body, args.concurrency, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub.shutdown()
+
+    result.update({"target": args.target, "workers": args.workers, "threads": args.threads,
+                   "concurrency": args.concurrency, "llm_latency_ms": args.llm_latency_ms})
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
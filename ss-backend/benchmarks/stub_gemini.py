@@ -0,0 +1,118 @@
+"""
+Local stand-in for the Gemini generateContent API, for offline testing and
+benchmarks. Point the backend at it with
+
+    GEMINI_BASE_URL=http://127.0.0.1:8090/v1beta
+
+    python benchmarks/stub_gemini.py [--port 8090] [--latency-ms 800] [--chunk-ms 50] [--error-rate 0.1]
+
+Both generateContent and streamGenerateContent (alt=sse) are served;
+--latency-ms delays the first byte, --chunk-ms spaces out streamed chunks
+and --error-rate answers that fraction of requests with a 500 error.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TEXT = (
+    "**Attributes**\n\n- Age: stub\n\n**Overdose Probability:** **stub**\n\n"
+    "---\n*This response was generated by the local Gemini stub.*"
+)
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency_seconds = 0.0
+    chunk_seconds = 0.0
+    error_rate = 0.0
+    request_count = 0
+    error_count = 0
+    count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": {"message": "Invalid JSON payload"}})
+        with StubGeminiHandler.count_lock:
+            StubGeminiHandler.request_count += 1
+
+        time.sleep(self.latency_seconds)
+        if self.error_rate and random.random() < self.error_rate:
+            with StubGeminiHandler.count_lock:
+                StubGeminiHandler.error_count += 1
+            return self._send_json(500, {"error": {"message": "Stub error (--error-rate)"}})
+        path = self.path.split("?")[0]
+        if path.endswith(":streamGenerateContent"):
+            return self._send_stream()
+        if not path.endswith(":generateContent"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+        self._send_json(200, {
+            "candidates": [{"content": {"parts": [{"text": STUB_TEXT}], "role": "model"}}]
+        })
+
+    def _send_stream(self):
+        # No Content-Length: the body ends when the connection closes
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = STUB_TEXT.split(" ")
+        for i in range(0, len(words), 4):
+            text = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+            chunk = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+            try:
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            time.sleep(self.chunk_seconds)
+
+
+def start_stub(port=0, latency_ms=0.0, chunk_ms=0.0, error_rate=0.0):
+    """Starts the stub on a background thread; returns the server (see server.server_port)."""
+    handler = type("Handler", (StubGeminiHandler,), {
+        "latency_seconds": latency_ms / 1000.0,
+        "chunk_seconds": chunk_ms / 1000.0,
+        "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--chunk-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    server = start_stub(args.port, args.latency_ms, args.chunk_ms, args.error_rate)
+    print(f"Stub Gemini listening on http://127.0.0.1:{server.server_port}/v1beta")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Benchmark suite: in-process micro-benchmarks plus a load test of the
+serving app against the local Gemini stub, written as one JSON file so
+runs can be compared.
+
+    python benchmarks/suite.py run --out bench.json
+    python benchmarks/suite.py run --out new.json --baseline bench.json
+    python benchmarks/suite.py compare bench.json new.json [--threshold 0.1]
+
+Run from ss-backend/. `run` times make_prediction, predict_proba,
+make_predictions_batch, the extract_* functions and parse_age, then starts
+app.py (gunicorn; --target asgi for uvicorn) with the stub at
+--llm-latency-ms/--llm-error-rate and drives /predict_expanded and
+/predict_from_text(_stream) at each --concurrency level. Each scenario records
+throughput, p50/p95/p99 latency, status counts and the RSS/PSS of every
+worker after the load. `compare` (or `run --baseline`) flags metrics that
+got worse by more than --threshold and exits with status 1 if any did.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from bench_extract import SAMPLE_TEXTS  # noqa: E402
+from cold_start import memory_kb  # noqa: E402
+from load_test import run_load, start_server, text_body  # noqa: E402
+from stub_gemini import start_stub  # noqa: E402
+
+EXPANDED_RECORDS = [
+    {"Age": "15 to 19", "Gender": "Male", "Neighborhood": "exchange", "Substance": "fentanyl"},
+    {"Age": "30 to 34", "Gender": "Female", "Neighborhood": "tuxedo", "Substance": "opioids"},
+    {"Age": "45 to 49", "Gender": "Male", "Neighborhood": "daniel mcintyre", "Substance": "alcohol"},
+    {"Age": "70 to 74", "Gender": "Female", "Neighborhood": "unknown", "Substance": "cocaine"},
+]
+
+ENDPOINTS = {
+    "/predict_expanded": lambda rng: rng.choice(EXPANDED_RECORDS),
+    "/predict_from_text": text_body,
+    "/predict_from_text_stream": text_body,  # timed until the last event
+}
+
+# Metric name suffixes where a larger value is better; everything else is a time or a size
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+# --------------------------------------------------------------------
+# Micro-benchmarks
+# --------------------------------------------------------------------
+def time_per_call(fn, calls_per_run, repeat=5):
+    """Best and median microseconds per call of fn, which makes calls_per_run calls."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()  # enough runs for at least 0.2s
+    runs = sorted(timer.repeat(repeat=repeat, number=number))
+    scale = 1e6 / (number * calls_per_run)
+    return {"us_per_call": runs[0] * scale, "us_per_call_median": runs[len(runs) // 2] * scale}
+
+
+def run_micro():
+    os.environ.setdefault("MODEL_POLL_SECONDS", "-1")
+    import app
+
+    texts = [text.lower() for text in SAMPLE_TEXTS]
+    fields = [app.extractor.extract(text) for text in texts]
+    rows = [(f["Age"], f["Gender"], f["Neighborhood"], f["Substance"]) for f in fields]
+    records = [app.prediction_record(*row) for row in rows] * 25
+    bundle = app.registry.get()
+    features = bundle.features
+    X = features.encode([app.parse_age(r[0]) for r in rows], [int(r[1] == "female") for r in rows],
+                        [features.neigh_position(r[2]) for r in rows],
+                        [features.subst_position(r[3]) for r in rows])
+
+    cases = {
+        "parse_age": (lambda: [app.parse_age(row[0]) for row in rows], len(rows)),
+        "extract_age": (lambda: [app.extract_age(text) for text in texts], len(texts)),
+        "extract_gender": (lambda: [app.extract_gender(text) for text in texts], len(texts)),
+        "extract_neighborhood": (lambda: [app.extract_neighborhood(text) for text in texts], len(texts)),
+        "extract_substance": (lambda: [app.extract_substance(text) for text in texts], len(texts)),
+        "make_prediction": (lambda: [app.make_prediction(*row) for row in rows], len(rows)),
+        "predict_proba_row": (lambda: [bundle.predict_proba(X[i:i + 1]) for i in range(len(rows))], len(rows)),
+        f"make_predictions_batch_{len(records)}": (lambda: app.make_predictions_batch(records), 1),
+    }
+    results = {name: time_per_call(fn, calls) for name, (fn, calls) in cases.items()}
+    results["model"] = {"version": bundle.version, "backend": type(bundle.model).__name__,
+                        "risk_table": bundle.risk_table is not None}
+    return results
+
+
+# --------------------------------------------------------------------
+# Load test
+# --------------------------------------------------------------------
+def child_pids(pid):
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    return pids
+
+
+def worker_memory(proc):
+    """RSS/PSS in MB of each worker: the server's child processes, or the server itself."""
+    pids = child_pids(proc.pid) or [proc.pid]
+    memory = []
+    for pid in pids:
+        try:
+            fields = memory_kb(pid)
+        except FileNotFoundError:
+            continue
+        memory.append({"rss_mb": fields["Rss"] / 1024, "pss_mb": fields["Pss"] / 1024})
+    return {
+        "workers": memory,
+        "rss_mb_per_worker": sum(m["rss_mb"] for m in memory) / len(memory) if memory else None,
+        "pss_mb_per_worker": sum(m["pss_mb"] for m in memory) / len(memory) if memory else None,
+    }
+
+
+def run_scenarios(args):
+    stub = start_stub(0, args.llm_latency_ms, error_rate=args.llm_error_rate)
+    env = dict(os.environ,
+               GEMINI_BASE_URL=f"http://127.0.0.1:{stub.server_port}/v1beta",
+               GEMINI_API_KEY="stub",
+               GEMINI_CACHE_SIZE="0",
+               MODEL_POLL_SECONDS="-1")
+    proc, base_url = start_server(args.target, args.workers, args.threads, env)
+    scenarios = {}
+    try:
+        for endpoint, make_body in ENDPOINTS.items():
+            for concurrency in args.concurrency:
+                url = base_url + endpoint
+                if args.warmup > 0:
+                    run_load(url, make_body, concurrency, args.warmup)
+                result = run_load(url, make_body, concurrency, args.duration)
+                result["memory"] = worker_memory(proc)
+                scenarios[f"{endpoint}@c{concurrency}"] = result
+                print(f"{endpoint} c={concurrency}: {result['throughput_rps']:.1f} rps, "
+                      f"p99 {result['latency_ms']['p99']} ms, statuses {result['status_counts']}", file=sys.stderr)
+    finally:
+        proc.terminate()
+        proc.wait()
+        stub.shutdown()
+    return scenarios
+
+
+# --------------------------------------------------------------------
+# Comparing runs
+# --------------------------------------------------------------------
+def flatten(results):
+    """{"micro.parse_age.us_per_call": 1.2, "load./predict_expanded@c8.latency_ms.p99": 9.1, ...}"""
+    metrics = {}
+    for name, micro in results.get("micro", {}).items():
+        if "us_per_call" in micro:
+            metrics[f"micro.{name}.us_per_call"] = micro["us_per_call"]
+    for name, scenario in results.get("load", {}).items():
+        metrics[f"load.{name}.throughput_rps"] = scenario["throughput_rps"]
+        for q, value in scenario["latency_ms"].items():
+            metrics[f"load.{name}.latency_ms.{q}"] = value
+        metrics[f"load.{name}.pss_mb_per_worker"] = scenario["memory"]["pss_mb_per_worker"]
+    return {name: value for name, value in metrics.items() if value is not None}
+
+
+def compare(baseline, current, threshold=0.1):
+    """One row per metric found in both runs; "regression" is set when it got worse by > threshold."""
+    old, new = flatten(baseline), flatten(current)
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        change = (new[name] - old[name]) / old[name] if old[name] else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        rows.append({"metric": name, "baseline": old[name], "current": new[name],
+                     "change": change, "regression": worse > threshold})
+    return rows
+
+
+def print_comparison(baseline, current, threshold):
+    for name in sorted(baseline.get("config", {}).keys() | current.get("config", {}).keys()):
+        old, new = baseline.get("config", {}).get(name), current.get("config", {}).get(name)
+        if old != new:
+            print(f"note: {name} differs ({old} -> {new}); the runs may not be comparable")
+    rows = compare(baseline, current, threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<60}{row['baseline']:>12.2f}{row['current']:>12.2f}"
+              f"{row['change']:>+9.1%}  {flag}")
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} of {len(rows)} metrics regressed by more than {threshold:.0%}")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and write a results JSON")
+    run.add_argument("--out", default="bench_results.json")
+    run.add_argument("--baseline", help="results JSON to compare this run against")
+    run.add_argument("--skip-micro", action="store_true")
+    run.add_argument("--skip-load", action="store_true")
+    run.add_argument("--target", choices=["flask", "asgi"], default="flask")
+    run.add_argument("--workers", type=int, default=2, help="server processes")
+    run.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker (flask only)")
+    run.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    run.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    run.add_argument("--warmup", type=float, default=1.0, help="unrecorded seconds before each scenario")
+    run.add_argument("--llm-latency-ms", type=float, default=300.0)
+    run.add_argument("--llm-error-rate", type=float, default=0.0)
+    run.add_argument("--threshold", type=float, default=0.1)
+
+    cmp = commands.add_parser("compare", help="compare two results JSON files")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressions = print_comparison(load_results(args.baseline), load_results(args.current), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {name: value for name, value in vars(args).items()
+                   if name not in ("command", "out", "baseline", "threshold")},
+    }
+    if not args.skip_micro:
+        results["micro"] = run_micro()
+    if not args.skip_load:
+        results["load"] = run_scenarios(args)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        regressions = print_comparison(load_results(args.baseline), results, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
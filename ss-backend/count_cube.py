@@ -0,0 +1,136 @@
+"""
+Persisted count cube of distinct (AgeNumeric, GenderNum, neighbourhood,
+IsOverdose) combinations, so retraining doesn't re-read every incident.
+
+Monthly incident CSVs are merged into the cube one at a time. A file's rows
+are skipped if their Incident Number was already merged from an earlier
+file, so re-delivered or overlapping extracts aren't counted twice (several
+rows of one incident within the same file are separate patients and are all
+kept; rows without an Incident Number can't be matched and are always
+kept). The cube is a single .npz, replaced atomically on save.
+
+    python count_cube.py merge data/2025-03.csv [data/2025-04.csv ...]
+    python count_cube.py info
+    python train_model_expanded.py --cube data/count_cube.npz
+"""
+import argparse
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from training_data import TrainingMatrix, encode_matrix, read_features
+
+CUBE_FILE = os.path.join("data", "count_cube.npz")
+N_LABELS = 3
+
+
+class CountCube(NamedTuple):
+    age_numeric: np.ndarray   # int32
+    gender_num: np.ndarray    # int8
+    neigh_ids: np.ndarray     # int32, into neigh_names
+    label: np.ndarray         # int8
+    count: np.ndarray         # int64
+    neigh_names: list
+    incidents: np.ndarray     # sorted unique Incident Numbers merged so far
+    sources: list             # merged file names, in order
+
+    def info(self):
+        return {
+            "rows": int(self.count.sum()),
+            "distinct_rows": len(self.count),
+            "neighbourhoods": len(self.neigh_names),
+            "incidents": len(self.incidents),
+            "sources": list(self.sources),
+        }
+
+
+def empty_cube():
+    return CountCube(np.zeros(0, np.int32), np.zeros(0, np.int8), np.zeros(0, np.int32), np.zeros(0, np.int8),
+                     np.zeros(0, np.int64), [], np.zeros(0, dtype=str), [])
+
+
+def load_cube(path=CUBE_FILE):
+    if not os.path.exists(path):
+        return empty_cube()
+    with np.load(path) as arrays:
+        return CountCube(arrays["age_numeric"], arrays["gender_num"], arrays["neigh_ids"], arrays["label"],
+                         arrays["count"], arrays["neigh_names"].tolist(), arrays["incidents"],
+                         arrays["sources"].tolist())
+
+
+def save_cube(cube, path=CUBE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path, age_numeric=cube.age_numeric, gender_num=cube.gender_num, neigh_ids=cube.neigh_ids,
+             label=cube.label, count=cube.count, neigh_names=np.array(cube.neigh_names, dtype=str),
+             incidents=cube.incidents, sources=np.array(cube.sources, dtype=str))
+    os.replace(tmp_path, path)
+
+
+def _aggregate(age_numeric, gender_num, neigh_ids, label, count, n_neighs):
+    """Sums count over identical (age, gender, neighbourhood, label) rows."""
+    key = ((age_numeric.astype(np.int64) * 2 + gender_num) * n_neighs + neigh_ids) * N_LABELS + label
+    unique_keys, inverse = np.unique(key, return_inverse=True)
+    counts = np.bincount(inverse, weights=count, minlength=len(unique_keys)).astype(np.int64)
+    label, rest = unique_keys % N_LABELS, unique_keys // N_LABELS
+    neigh_ids, rest = rest % n_neighs, rest // n_neighs
+    return (rest // 2).astype(np.int32), (rest % 2).astype(np.int8), neigh_ids.astype(np.int32), \
+        label.astype(np.int8), counts
+
+
+def merge_csv(cube, csv_path, chunksize=250_000):
+    """Returns (new cube with csv_path's new incidents added, number of rows added)."""
+    neigh_names = list(cube.neigh_names)
+    columns = read_features(csv_path, chunksize, neigh_names=neigh_names, with_incidents=True)
+
+    # Incidents already merged from earlier files are skipped; rows with unparseable ages are dropped
+    has_incident = columns.incidents != ""
+    seen = has_incident & np.isin(columns.incidents, cube.incidents)
+    keep = ~seen & ~np.isnan(columns.age_numeric)
+    merged = _aggregate(
+        np.concatenate([cube.age_numeric, columns.age_numeric[keep].astype(np.int32)]),
+        np.concatenate([cube.gender_num, columns.gender_num[keep]]),
+        np.concatenate([cube.neigh_ids, columns.neigh_ids[keep]]),
+        np.concatenate([cube.label, columns.label[keep]]),
+        np.concatenate([cube.count, np.ones(keep.sum(), dtype=np.int64)]),
+        max(len(neigh_names), 1),
+    )
+    incidents = np.union1d(cube.incidents, columns.incidents[keep & has_incident])
+    sources = cube.sources + [os.path.basename(csv_path)]
+    return CountCube(*merged, neigh_names, incidents, sources), int(keep.sum())
+
+
+def cube_training_matrix(cube):
+    """TrainingMatrix over the cube's distinct rows, with their counts as sample_weight."""
+    age_numeric = cube.age_numeric.astype(np.float64)
+    X, feature_cols = encode_matrix(age_numeric, cube.gender_num, cube.neigh_ids, cube.neigh_names)
+    return TrainingMatrix(X, cube.label, feature_cols, age_numeric, cube.gender_num, cube.count)
+
+
+def split_counts(count, test_size=0.15, seed=42):
+    """Splits every row's count into (train, test) counts; each incident lands in test with probability test_size."""
+    test = np.random.default_rng(seed).binomial(count, test_size)
+    return count - test, test
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cube", default=CUBE_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subparsers.add_parser("merge", help="merge incident CSVs into the cube")
+    merge_parser.add_argument("csv", nargs="+")
+    subparsers.add_parser("info", help="print the cube's summary")
+    args = parser.parse_args()
+
+    cube = load_cube(args.cube)
+    if args.command == "merge":
+        for csv_path in args.csv:
+            cube, added = merge_csv(cube, csv_path)
+            print(f"Merged {added} new rows from {csv_path}")
+        save_cube(cube, args.cube)
+    print(cube.info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Evaluation bundle written by training next to the published model:
+evaluation.npz holds the test-set arrays (labels, predictions, weights,
+age/gender for the plots, confusion matrix, feature importances) and
+evaluation.json the small metadata (feature names, CV scores, the
+classification report as a dict, stage timings).
+
+Only NumPy and the standard library are needed to write or read it;
+report.py turns a bundle into charts.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+import numpy as np
+
+ARRAYS_FILE = "evaluation.npz"
+SUMMARY_FILE = "evaluation.json"
+
+
+class Evaluation(NamedTuple):
+    y_test: np.ndarray
+    y_pred: np.ndarray
+    sample_weight: np.ndarray     # None when every test row counts once
+    age_numeric: np.ndarray
+    gender_num: np.ndarray
+    confusion_matrix: np.ndarray
+    importances: np.ndarray
+    summary: dict
+
+    def expanded(self):
+        """Row indices with each test row repeated by its weight (one per incident)."""
+        rows = np.arange(len(self.y_test))
+        return rows if self.sample_weight is None else np.repeat(rows, self.sample_weight.astype(np.int64))
+
+
+def write_evaluation(out_dir, y_test, y_pred, sample_weight, age_numeric, gender_num, confusion_matrix,
+                     importances, **summary):
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = dict(y_test=y_test, y_pred=y_pred, age_numeric=age_numeric, gender_num=gender_num,
+                  confusion_matrix=confusion_matrix, importances=importances)
+    if sample_weight is not None:
+        arrays["sample_weight"] = sample_weight
+    np.savez(os.path.join(out_dir, ARRAYS_FILE), **arrays)
+
+    summary = {"created_at": datetime.now(timezone.utc).isoformat(), **summary}
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    return out_dir
+
+
+def load_evaluation(path):
+    with open(os.path.join(path, SUMMARY_FILE)) as f:
+        summary = json.load(f)
+    with np.load(os.path.join(path, ARRAYS_FILE)) as arrays:
+        return Evaluation(arrays["y_test"], arrays["y_pred"],
+                          arrays["sample_weight"] if "sample_weight" in arrays.files else None,
+                          arrays["age_numeric"], arrays["gender_num"], arrays["confusion_matrix"],
+                          arrays["importances"], summary)
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class FeatureIndex:
+    """
+    Column-index maps for one feature_cols list, so inputs can be encoded
+    straight into a NumPy matrix instead of a cell-by-cell DataFrame.
+
+    Encoding matches make_prediction: AgeNumeric and GenderNum are set,
+    "neigh_<name>" / "subst_<name>" are one-hot when that column exists,
+    and every other column (e.g. the age_* groups) stays 0.
+    """
+
+    def __init__(self, feature_cols):
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+        positions = {col: i for i, col in enumerate(self.feature_cols)}
+        self.age_pos = positions.get("AgeNumeric", -1)
+        self.gender_pos = positions.get("GenderNum", -1)
+        self.neigh_cols = [c for c in self.feature_cols if c.startswith("neigh_")]
+        self.subst_cols = [c for c in self.feature_cols if c.startswith("subst_")]
+        self.neigh_pos = {c: positions[c] for c in self.neigh_cols}
+        self.subst_pos = {c: positions[c] for c in self.subst_cols}
+
+    def neigh_position(self, neigh_str):
+        """Column index of the neighbourhood one-hot, or -1 if the model has none."""
+        return self.neigh_pos.get(f"neigh_{neigh_str.lower()}", -1)
+
+    def subst_position(self, subst_str):
+        return self.subst_pos.get(f"subst_{subst_str.lower()}", -1)
+
+    def encode(self, age_numeric, gender_num, neigh_pos, subst_pos):
+        """
+        Builds the feature matrix for n rows from four length-n sequences.
+        Positions of -1 leave the row's one-hot block empty.
+        """
+        age_numeric = np.asarray(age_numeric, dtype=np.float64)
+        n = age_numeric.shape[0]
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        rows = np.arange(n)
+        if self.age_pos >= 0:
+            X[:, self.age_pos] = age_numeric
+        if self.gender_pos >= 0:
+            X[:, self.gender_pos] = gender_num
+        for positions in (np.asarray(neigh_pos, dtype=np.intp), np.asarray(subst_pos, dtype=np.intp)):
+            hit = positions >= 0
+            X[rows[hit], positions[hit]] = 1.0
+        return X
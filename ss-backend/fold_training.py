@@ -0,0 +1,122 @@
+"""
+Fits the base forest and CalibratedClassifierCV's calibration folds in one
+process pool, and scores cross-validation from the folds' out-of-fold
+predictions instead of refitting.
+
+CalibratedClassifierCV(cv=3) fits a clone of the forest on each of
+StratifiedKFold(3)'s training splits and calibrates it on the held-out
+split. fit_calibrated_forest makes exactly those fits (same splits, same
+clones, same seeds) plus the full-data base fit, all in parallel, then
+builds the calibrators with scikit-learn's own helper. The resulting model
+gives the same predict_proba as CalibratedClassifierCV.fit, and the
+held-out predictions it already computed double as 3-fold CV scores.
+
+_fit_calibrator is private, so scikit-learn is pinned to the minor release
+this was checked against (requirements.txt), and every fold's calibrator
+is compared with the one the public API builds for the same fitted fold
+model (CalibratedClassifierCV(FrozenEstimator(...))). Training stops with
+FoldCheckError if they differ; --cv-mode refit still works then.
+"""
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.calibration import CalibratedClassifierCV, _fit_calibrator
+from sklearn.frozen import FrozenEstimator
+from sklearn.metrics import f1_score
+from sklearn.model_selection import check_cv
+
+# Held-out rows per fold compared against the public calibration path
+CHECK_ROWS = 2000
+
+
+class FoldCheckError(RuntimeError):
+    """A fold's calibrator differs from the one CalibratedClassifierCV builds."""
+
+
+class FoldTraining(NamedTuple):
+    calibrated_model: CalibratedClassifierCV
+    base_model: object
+    cv_scores: np.ndarray        # weighted F1 of the uncalibrated forest on each held-out fold
+    fit_seconds: dict            # wall time of each fit, as measured inside its worker
+
+
+def default_workers():
+    return int(os.getenv("TRAIN_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def _fit(estimator, X, y, sample_weight, train, test):
+    """Fits estimator on the train rows; returns it with its predict_proba on the test rows."""
+    started = time.perf_counter()
+    fit_params = {} if sample_weight is None else {"sample_weight": sample_weight[train]}
+    estimator.fit(X[train], y[train], **fit_params)
+    predictions = estimator.predict_proba(X[test]) if test is not None else None
+    return estimator, predictions, time.perf_counter() - started
+
+
+def _calibrate(estimator, predictions, y, classes, sample_weight):
+    return _fit_calibrator(estimator, predictions, y, classes, "isotonic", xp=np, sample_weight=sample_weight)
+
+
+def check_fold(index, calibrated, fold_model, X_test, y_test, sw_test):
+    """Raises FoldCheckError unless `calibrated` matches the public API's calibration of fold_model."""
+    # A frozen model predicts the same whatever the splits, so one split over every row is
+    # enough (the default cv=5 would also reject classes with fewer than 5 held-out rows)
+    every_row = np.arange(len(y_test))
+    reference = CalibratedClassifierCV(FrozenEstimator(fold_model), method="isotonic",
+                                       cv=[(every_row, every_row)])
+    with warnings.catch_warnings():
+        # FrozenEstimator.fit ignores sample_weight; the calibrator itself still gets it
+        warnings.simplefilter("ignore", UserWarning)
+        reference.fit(X_test, y_test, sample_weight=sw_test)
+    rows = X_test[:CHECK_ROWS]
+    if not np.array_equal(calibrated.predict_proba(rows), reference.predict_proba(rows)):
+        raise FoldCheckError(
+            f"Calibration fold {index} differs from CalibratedClassifierCV on this scikit-learn "
+            f"release; train with --cv-mode refit or use the version pinned in requirements.txt")
+
+
+def fit_calibrated_forest(estimator, X, y, sample_weight=None, cv=3, workers=None):
+    """
+    Returns FoldTraining for estimator on (X, y). With workers=1 every fit
+    runs in this process; otherwise up to `workers` fits run at once.
+    """
+    y = np.asarray(y)
+    workers = workers or default_workers()
+    classes = np.unique(y)
+    # The splitter CalibratedClassifierCV itself uses (StratifiedKFold for classifiers)
+    folds = list(check_cv(cv, y, classifier=True).split(np.zeros(len(y)), y))
+    everything = np.arange(len(y))
+    jobs = [(clone(estimator), X, y, sample_weight, everything, None)]
+    jobs += [(clone(estimator), X, y, sample_weight, train, test) for train, test in folds]
+
+    if workers == 1:
+        results = [_fit(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = [future.result() for future in [pool.submit(_fit, *job) for job in jobs]]
+
+    base_model = results[0][0]
+    calibrated_model = CalibratedClassifierCV(estimator, method="isotonic", cv=cv)
+    calibrated_model.classes_ = classes
+    calibrated_model.calibrated_classifiers_ = []
+    cv_scores = []
+    for i, ((train, test), (fold_model, predictions, _)) in enumerate(zip(folds, results[1:])):
+        # CalibratedClassifierCV casts the weights to the predictions' dtype before calibrating
+        sw_test = None if sample_weight is None else np.asarray(sample_weight, dtype=predictions.dtype)[test]
+        calibrated = _calibrate(fold_model, predictions, y[test], classes, sw_test)
+        check_fold(i, calibrated, fold_model, X[test], y[test], sw_test)
+        calibrated_model.calibrated_classifiers_.append(calibrated)
+        y_pred = fold_model.classes_.take(np.argmax(predictions, axis=1))
+        cv_scores.append(f1_score(y[test], y_pred, average="weighted", sample_weight=sw_test))
+    calibrated_model.n_features_in_ = base_model.n_features_in_
+    if hasattr(base_model, "feature_names_in_"):
+        calibrated_model.feature_names_in_ = base_model.feature_names_in_
+
+    fit_seconds = {"base": results[0][2]}
+    fit_seconds.update({f"fold_{i}": result[2] for i, result in enumerate(results[1:])})
+    return FoldTraining(calibrated_model, base_model, np.array(cv_scores), fit_seconds)
@@ -0,0 +1,239 @@
+"""
+Flattens the CalibratedClassifierCV(RandomForestClassifier) model into plain
+NumPy arrays and evaluates it without scikit-learn.
+
+Every tree of every calibration fold is laid out in one set of contiguous
+node arrays; each fold's isotonic calibrators become (x, y) interpolation
+tables. CompiledModel.predict_proba walks all trees for a whole batch at
+once and repeats scikit-learn's arithmetic step by step (float32 inputs,
+tree-by-tree accumulation, np.interp, per-row normalisation), so its output
+is bit-for-bit equal to the original model's predict_proba.
+
+The export is a directory with one uncompressed .npy file per array.
+CompiledModel.load opens them with mmap_mode="r", so every worker process
+serving the same version shares one read-only copy through the page cache
+instead of each holding its own unpickled forest.
+
+    python forest_compiler.py models/<version>    # export + verify
+"""
+import os
+import sys
+
+import numpy as np
+
+COMPILED_DIR = "model_compiled"
+
+
+# --------------------------------------------------------------------
+# Export (needs scikit-learn; runs at training/publish time)
+# --------------------------------------------------------------------
+def _tree_leaf_values(tree, n_classes):
+    import sklearn
+
+    values = tree.tree_.value[:, 0, :n_classes].astype(np.float64)
+    major, minor = (int(p) for p in sklearn.__version__.split(".")[:2])
+    if (major, minor) < (1, 4):
+        # Older releases store weighted counts and normalise in predict_proba
+        normalizer = values.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values /= normalizer
+    return values
+
+
+def export_compiled(model, path):
+    """Writes the arrays for a fitted CalibratedClassifierCV into the directory path."""
+    classes = np.asarray(model.classes_)
+    n_classes = len(classes)
+    if getattr(model, "method", "isotonic") != "isotonic":
+        raise ValueError("Only isotonic calibration can be compiled")
+
+    feature, threshold, children, values = [], [], [], []
+    roots, fold_tree_offsets, max_depth = [], [0], 0
+    class_index, calib_x, calib_y, calib_offsets, calib_bounds = [], [], [], [0], []
+    node_offset = 0
+
+    for calibrated in model.calibrated_classifiers_:
+        # Attribute names changed across scikit-learn releases
+        forest = getattr(calibrated, "estimator", None)
+        if forest is None:
+            forest = calibrated.base_estimator
+        calibrators = getattr(calibrated, "calibrators", None)
+        if calibrators is None:
+            calibrators = calibrated.calibrators_
+        if len(calibrators) != n_classes or len(forest.classes_) != n_classes:
+            raise ValueError("Every calibration fold must have seen every class")
+
+        for tree in forest.estimators_:
+            t = tree.tree_
+            is_leaf = t.children_left < 0
+            own = np.arange(t.node_count) + node_offset
+            # Leaves point at themselves, so walking past them is a no-op
+            feature.append(np.where(is_leaf, 0, t.feature).astype(np.intp))
+            threshold.append(np.where(is_leaf, 0.0, t.threshold).astype(np.float64))
+            children.append(np.stack([
+                np.where(is_leaf, own, t.children_left + node_offset),
+                np.where(is_leaf, own, t.children_right + node_offset),
+            ], axis=1).astype(np.intp))
+            values.append(_tree_leaf_values(tree, n_classes))
+            roots.append(node_offset)
+            max_depth = max(max_depth, t.max_depth)
+            node_offset += t.node_count
+        fold_tree_offsets.append(len(roots))
+
+        # Which model class each of this fold's forest columns feeds
+        class_index.append(np.searchsorted(classes, forest.classes_).astype(np.int32))
+        for calibrator in calibrators:
+            calib_x.append(np.asarray(calibrator.X_thresholds_, dtype=np.float64))
+            calib_y.append(np.asarray(calibrator.y_thresholds_, dtype=np.float64))
+            calib_offsets.append(calib_offsets[-1] + len(calib_x[-1]))
+            calib_bounds.append((calibrator.X_min_, calibrator.X_max_))
+
+    arrays = dict(
+        classes=classes,
+        feature=np.concatenate(feature),
+        threshold=np.concatenate(threshold),
+        children=np.concatenate(children),
+        value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.intp),
+        fold_tree_offsets=np.asarray(fold_tree_offsets, dtype=np.int32),
+        max_depth=np.asarray(max_depth, dtype=np.int32),
+        n_features=np.asarray(model.n_features_in_, dtype=np.int32),
+        class_index=np.stack(class_index),
+        calib_x=np.concatenate(calib_x),
+        calib_y=np.concatenate(calib_y),
+        calib_offsets=np.asarray(calib_offsets, dtype=np.int64),
+        calib_bounds=np.asarray(calib_bounds, dtype=np.float64),
+    )
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    return path
+
+
+# --------------------------------------------------------------------
+# Evaluation (NumPy only)
+# --------------------------------------------------------------------
+class CompiledModel:
+    """
+    Drop-in for the calibrated model's predict_proba / predict / classes_
+    on an encoded feature matrix (see features.FeatureIndex.encode).
+    """
+
+    def __init__(self, arrays, batch_size=4096):
+        self.classes_ = np.asarray(arrays["classes"])
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        # children[node] = (left, right), flattened so the walk can index 2 * node + go_right
+        self.children = arrays["children"].reshape(-1)
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.fold_tree_offsets = arrays["fold_tree_offsets"]
+        self.max_depth = int(arrays["max_depth"].item())
+        self.n_features_in_ = int(arrays["n_features"].item())
+        self.class_index = arrays["class_index"]
+        self.calib_x = arrays["calib_x"]
+        self.calib_y = arrays["calib_y"]
+        self.calib_offsets = arrays["calib_offsets"]
+        self.calib_bounds = arrays["calib_bounds"]
+        self.batch_size = batch_size
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        arrays = {}
+        for filename in os.listdir(path):
+            name, ext = os.path.splitext(filename)
+            if ext == ".npy":
+                array = np.load(os.path.join(path, filename), mmap_mode="r" if mmap else None)
+                # Plain ndarray view of the mapping: same pages, no np.memmap wrapping on every index
+                arrays[name] = np.asarray(array)
+        return cls(arrays)
+
+    def _leaves(self, X):
+        """Leaf node index reached in every tree, shape (n_samples, n_trees)."""
+        n_samples, n_trees = X.shape[0], len(self.roots)
+        flat_X = X.reshape(-1)
+        row_offset = np.repeat(np.arange(n_samples, dtype=np.intp) * X.shape[1], n_trees)
+        nodes = np.tile(self.roots, n_samples)
+        for _ in range(self.max_depth):
+            # Same test as scikit-learn (x <= threshold goes left); encoded inputs are never NaN
+            go_right = flat_X[row_offset + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+        return nodes.reshape(n_samples, n_trees)
+
+    def _calibrate(self, k, scores):
+        start, end = self.calib_offsets[k], self.calib_offsets[k + 1]
+        low, high = self.calib_bounds[k]
+        return np.interp(np.clip(scores, low, high), self.calib_x[start:end], self.calib_y[start:end])
+
+    def _predict_batch(self, X):
+        n_samples, n_classes = X.shape[0], len(self.classes_)
+        leaves = self._leaves(X)
+        mean_proba = np.zeros((n_samples, n_classes))
+        n_folds = len(self.fold_tree_offsets) - 1
+
+        for fold in range(n_folds):
+            first, last = self.fold_tree_offsets[fold], self.fold_tree_offsets[fold + 1]
+            # RandomForestClassifier.predict_proba: sum tree by tree, then average
+            forest_proba = np.zeros((n_samples, n_classes))
+            for t in range(first, last):
+                forest_proba += self.value[leaves[:, t]]
+            forest_proba /= last - first
+
+            # _CalibratedClassifier.predict_proba (isotonic, multiclass)
+            proba = np.zeros((n_samples, n_classes))
+            for column, class_idx in enumerate(self.class_index[fold]):
+                proba[:, class_idx] = self._calibrate(fold * n_classes + column, forest_proba[:, column])
+            denominator = np.sum(proba, axis=1)[:, np.newaxis]
+            uniform_proba = np.full_like(proba, 1 / n_classes)
+            proba = np.divide(proba, denominator, out=uniform_proba, where=denominator != 0)
+            proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+
+            mean_proba += proba
+        mean_proba /= n_folds
+        return mean_proba
+
+    def predict_proba(self, X):
+        # scikit-learn's trees compare float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, expected {self.n_features_in_}")
+        if X.shape[0] <= self.batch_size:
+            return self._predict_batch(X)
+        return np.concatenate([self._predict_batch(X[i:i + self.batch_size])
+                               for i in range(0, X.shape[0], self.batch_size)])
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def verify_compiled(model, compiled, X):
+    """Raises ValueError unless compiled.predict_proba(X) equals model.predict_proba(X) exactly."""
+    import pandas as pd
+
+    expected = model.predict_proba(pd.DataFrame(X, columns=getattr(model, "feature_names_in_", None)))
+    actual = compiled.predict_proba(X)
+    if not np.array_equal(expected, actual):
+        raise ValueError(f"Compiled model differs (max diff {np.max(np.abs(expected - actual))})")
+    print(f"Compiled model matches predict_proba bit-for-bit on {X.shape[0]} rows")
+
+
+def sample_inputs(features, n=5000, seed=0):
+    """Random encoded inputs over the realistic domain, for verification and benchmarks."""
+    rng = np.random.default_rng(seed)
+    neigh = np.array([-1] + [features.neigh_pos[c] for c in features.neigh_cols])
+    return features.encode(rng.integers(0, 121, n), rng.integers(0, 2, n),
+                           rng.choice(neigh, n), np.full(n, -1))
+
+
+if __name__ == "__main__":
+    import json
+
+    from model_registry import FEATURES_JSON_FILE, load_bundle
+
+    version_dir = sys.argv[1]
+    bundle = load_bundle(version_dir, os.path.basename(os.path.normpath(version_dir)), use_risk_table=False)
+    compiled = CompiledModel.load(export_compiled(bundle.model, os.path.join(version_dir, COMPILED_DIR)))
+    verify_compiled(bundle.model, compiled, sample_inputs(bundle.features))
+    # Versions published before the export existed only have the pickled column list
+    with open(os.path.join(version_dir, FEATURES_JSON_FILE), "w") as f:
+        json.dump(list(bundle.feature_cols), f)
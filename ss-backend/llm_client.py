@@ -0,0 +1,597 @@
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+
+class GeminiError(Exception):
+    """Raised when Gemini can't produce the formatted output (the message says why)."""
+
+
+def build_prompt(prediction_json):
+    """The formatting prompt for one /predict_from_text JSON payload."""
+    return f"""
+    You are a knowledgeable and articulate data analyst specializing in substance use risk prediction. Based on the JSON output below, please analyze the input data and generate a detailed, human-friendly summary. Your summary should include:
+
+2. An overdose probability, the percentage in bold, very clearly formatted.
+1. An interpretation of the overdose class (0, 3, or 10) and its significance in simple English, where:
+   - 0 represents low risk
+   - 1 represents medium risk (typically associated with alcohol)
+   - 2 represents high risk (typically associated with opioids, crystal meth, or cocaine)
+2. A discussion of the confidence level (Low, Medium, or High), and what that means in context.
+3. A plain language explanation of any high-risk factors identified in the input.
+4. If the input mentions a location like Winnipeg, provide additional local contextual insights.
+5. Mention the age, location, gender, and substance (all starting with a capital letter e.g. "Male") -- in ur response again CLEARLY at the start of your message in a list format. If the age range mentioned is just 1 age, e.g. 13 to 13, just use 13 instead of 13 to 13. DO NOT include Winnipeg in the location, just the name of the area.
+6. Use bold headings, separate concerns, and make your output readable.
+
+You are presenting this information to a user in markdown format, please make sure it is readable, not too long, concise, and something that makes sense. Do NOT use sentences like "Okay, here's an analysis of the substance use prediction model's output, presented in a user-friendly markdown format:" to start or end your text, the user does not need to know how you are getting this output. Also, always end your message with a disclaimer: "This analysis is based solely on the provided data and should not be considered a definitive diagnosis or prediction. Professional medical and psychological evaluation is essential for a comprehensive assessment and personalized recommendations." in italics under a --- line in markdown.
+
+Below is the JSON output from the substance use prediction model:
+
+{prediction_json}
+
+Return your answer in clear, plain text with organized headings.
+"""
+
+
+def payload_key(payload, model):
+    """Stable hash of a prediction payload (key order and whitespace don't matter)."""
+    normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{model}\n{normalized}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl_seconds.
+    With persist_dir, entries are also written there as one JSON file per
+    key and read back on a memory miss, so they survive restarts.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=24 * 3600, persist_dir=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_dir = persist_dir
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def _fresh(self, stored_at):
+        return time.time() - stored_at < self.ttl_seconds
+
+    def _disk_path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[0]):
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        if not self.persist_dir:
+            return None
+        try:
+            with open(self._disk_path(key)) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._fresh(stored["stored_at"]):
+            return None
+        self._remember(key, stored["stored_at"], stored["value"])
+        return stored["value"]
+
+    def _remember(self, key, stored_at, value):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        stored_at = time.time()
+        self._remember(key, stored_at, value)
+        if self.persist_dir:
+            tmp_path = f"{self._disk_path(key)}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, "w") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f)
+            os.replace(tmp_path, self._disk_path(key))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Put on a stream_within queue once the Gemini stream has ended
+_STREAM_END = object()
+
+
+class _GeminiBase:
+    """Configuration, cache and counters shared by the sync and async clients."""
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL,
+                 connect_timeout=3.05, read_timeout=30.0, retries=2, backoff=0.5,
+                 pool_size=10, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.cache = cache if cache is not None else ResponseCache()
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0, "fallbacks": 0, "latency_seconds_total": 0.0,
+                       "latency_seconds_max": 0.0}
+
+    @classmethod
+    def from_env(cls, **overrides):
+        settings = dict(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            base_url=os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+            model=os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+            connect_timeout=float(os.getenv("GEMINI_CONNECT_TIMEOUT", 3.05)),
+            read_timeout=float(os.getenv("GEMINI_READ_TIMEOUT", 30)),
+            retries=int(os.getenv("GEMINI_RETRIES", 2)),
+            pool_size=int(os.getenv("GEMINI_POOL_SIZE", 10)),
+            cache=ResponseCache(
+                max_entries=int(os.getenv("GEMINI_CACHE_SIZE", 1024)),
+                ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL", 24 * 3600)),
+                persist_dir=os.getenv("GEMINI_CACHE_DIR") or None,
+            ),
+        )
+        settings.update(overrides)
+        return cls(**settings)
+
+    def _count(self, name, latency=None):
+        with self._stats_lock:
+            self._stats[name] += 1
+            if latency is not None:
+                self._stats["latency_seconds_total"] += latency
+                self._stats["latency_seconds_max"] = max(self._stats["latency_seconds_max"], latency)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        calls = stats["misses"]
+        stats["latency_seconds_avg"] = stats["latency_seconds_total"] / calls if calls else 0.0
+        stats["cache_entries"] = len(self.cache)
+        return stats
+
+    def generate_url(self):
+        return f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
+
+    def stream_url(self):
+        return f"{self.base_url}/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+    def request_body(self, payload):
+        prompt = build_prompt(json.dumps(payload, indent=2))
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    def _cached(self, payload):
+        key = payload_key(payload, self.model)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count("hits")
+        return key, cached
+
+    @staticmethod
+    def _cached_text(cached):
+        return cached["parts"][0]["text"] if isinstance(cached, dict) else cached
+
+    def _finish_format(self, key, status_code, text, json_body):
+        """Turns a generateContent response into formatted output (caching successes)."""
+        if status_code != 200:
+            self._count("errors")
+            raise GeminiError(f"Error from Gemini: {status_code} {text}")
+        try:
+            candidate = json_body()["candidates"][0]
+            formatted = candidate.get("output") or candidate.get("content")
+        except Exception as e:
+            self._count("errors")
+            raise GeminiError(f"Error parsing Gemini response: {str(e)}") from e
+        if not formatted:
+            self._count("errors")
+            raise GeminiError("No formatted output found in Gemini response.")
+
+        self.cache.put(key, formatted)
+        return formatted
+
+    def _skip_llm(self, budget_seconds):
+        """True when format_within should answer locally without calling Gemini."""
+        return not self.api_key or budget_seconds <= 0
+
+    def _fallback(self, payload, fallback):
+        self._count("fallbacks")
+        return fallback(payload)
+
+    def _stream_text(self, line):
+        """Text carried by one SSE line of streamGenerateContent ("" for other lines)."""
+        if not line or not line.startswith("data:"):
+            return ""
+        try:
+            parts = json.loads(line[5:])["candidates"][0]["content"]["parts"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise GeminiError(f"Error parsing Gemini response: {str(e)}") from e
+        return "".join(part.get("text", "") for part in parts)
+
+    def _finish_stream(self, key, chunks):
+        if chunks:
+            self.cache.put(key, {"parts": [{"text": "".join(chunks)}], "role": "model"})
+
+
+class GeminiClient(_GeminiBase):
+    """
+    Formats prediction payloads with Gemini over a pooled keep-alive session.
+
+    Requests use separate connect/read timeouts and retry connection errors
+    and 429/5xx responses with exponential backoff. Successful responses are
+    cached by payload_key, so a repeated question never leaves the process.
+    Point base_url at a local server (see benchmarks/stub_gemini.py) to run
+    without network access.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+        retry = Retry(total=self.retries, backoff_factor=self.backoff,
+                      status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset({"POST"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        # Calls made by format_within; at most pool_size at once, never queued
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="gemini")
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    def _generate(self, key, payload):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.generate_url(), json=self.request_body(payload),
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            self._count("misses", time.perf_counter() - start)
+            self._count("errors")
+            raise GeminiError(f"Error from Gemini: {type(e).__name__}") from e
+        self._count("misses", time.perf_counter() - start)
+        return self._finish_format(key, response.status_code, response.text, response.json)
+
+    def generate(self, payload):
+        """
+        Gemini's formatted output for a {"parsed_data", "prediction"} payload
+        (the candidate's "output" or "content"). Raises GeminiError on failure.
+        """
+        key, cached = self._cached(payload)
+        if cached is not None:
+            return cached
+        return self._generate(key, payload)
+
+    def format(self, payload):
+        """generate(), but failures come back as an error string (never cached)."""
+        try:
+            return self.generate(payload)
+        except GeminiError as e:
+            return str(e)
+
+    def format_within(self, payload, budget_seconds, fallback):
+        """
+        generate(payload) if it succeeds within budget_seconds, else
+        fallback(payload). A call that is still running when the budget runs
+        out keeps going in the background and caches its answer, so the next
+        identical request gets Gemini's text. When every slot is busy with
+        such calls, the fallback is used right away.
+        """
+        key, cached = self._cached(payload)
+        if cached is not None:
+            return cached
+        if self._skip_llm(budget_seconds) or not self._slots.acquire(blocking=False):
+            return self._fallback(payload, fallback)
+
+        future = self._executor.submit(self._generate, key, payload)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=budget_seconds)
+        except (FutureTimeout, GeminiError):
+            return self._fallback(payload, fallback)
+
+    def stream(self, payload):
+        """
+        Yields the formatted markdown for a payload in chunks as Gemini's
+        streaming API produces them (a cached answer is yielded in one piece).
+        The full text is cached once the stream completes. Raises GeminiError
+        on failure; closing the generator early closes the upstream request.
+        """
+        key, cached = self._cached(payload)
+        if cached is not None:
+            yield self._cached_text(cached)
+            return
+
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.stream_url(), json=self.request_body(payload),
+                                         timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            self._count("misses", time.perf_counter() - start)
+            self._count("errors")
+            raise GeminiError(f"Error from Gemini: {type(e).__name__}") from e
+
+        chunks = []
+        try:
+            if response.status_code != 200:
+                raise GeminiError(f"Error from Gemini: {response.status_code} {response.text}")
+            for line in self._iter_lines(response):
+                text = self._stream_text(line)
+                if text:
+                    chunks.append(text)
+                    yield text
+        except requests.RequestException as e:
+            self._count("errors")
+            raise GeminiError(f"Error from Gemini: {type(e).__name__}") from e
+        except GeminiError:
+            self._count("errors")
+            raise
+        finally:
+            response.close()
+            self._count("misses", time.perf_counter() - start)
+
+        self._finish_stream(key, chunks)
+
+    @staticmethod
+    def _iter_lines(response):
+        """
+        response.iter_lines(), but each line is returned as soon as it arrives
+        rather than after a full 512-byte read, so the first chunk isn't held
+        back (read1 needs urllib3 >= 2.3).
+        """
+        read1 = getattr(response.raw, "read1", None)
+        if read1 is None:
+            yield from response.iter_lines(decode_unicode=True)
+            return
+        pending = b""
+        while True:
+            data = read1(8192)
+            if not data:
+                break
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+        if pending:
+            yield pending.decode("utf-8", errors="replace")
+
+    def _pump_stream(self, payload, chunks, stop):
+        stream = self.stream(payload)
+        try:
+            for text in stream:
+                if stop.is_set():
+                    break
+                chunks.put(text)
+            chunks.put(_STREAM_END)
+        except GeminiError as e:
+            chunks.put(e)
+        finally:
+            stream.close()
+            self._slots.release()
+
+    def stream_within(self, payload, budget_seconds, fallback):
+        """
+        Yields ("delta" | "replace", text) events for a payload. Gemini's
+        chunks are passed through as "delta"s if the first one arrives within
+        budget_seconds. Otherwise, or if Gemini fails before sending anything,
+        fallback(payload) is sent as a single "delta", and a stream that is
+        still running finishes in the background and caches its answer (as
+        in format_within). A failure after some text was sent ends with a
+        "replace" holding fallback(payload). Closing the generator while
+        Gemini's text is being passed through closes the upstream stream.
+        """
+        key, cached = self._cached(payload)
+        if cached is not None:
+            yield "delta", self._cached_text(cached)
+            return
+        if self._skip_llm(budget_seconds) or not self._slots.acquire(blocking=False):
+            yield "delta", self._fallback(payload, fallback)
+            return
+
+        chunks, stop = queue.Queue(), threading.Event()
+        self._executor.submit(self._pump_stream, payload, chunks, stop)
+        deadline = time.monotonic() + budget_seconds
+        sent_text, finish_in_background = False, False
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=None if sent_text else max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    finish_in_background = True
+                    yield "delta", self._fallback(payload, fallback)
+                    return
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, GeminiError):
+                    yield ("replace" if sent_text else "delta"), self._fallback(payload, fallback)
+                    return
+                sent_text = True
+                yield "delta", item
+        finally:
+            if not finish_in_background:
+                stop.set()
+        if not sent_text:
+            yield "delta", self._fallback(payload, fallback)
+
+
+class AsyncGeminiClient(_GeminiBase):
+    """
+    asyncio counterpart of GeminiClient for the ASGI app (asgi_app.py),
+    built on an httpx.AsyncClient connection pool. Waiting on Gemini
+    doesn't hold a thread. Same cache, timeouts, retries and counters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import httpx  # only the ASGI app needs it
+
+        self._httpx = httpx
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            headers={"Content-Type": "application/json"},
+        )
+        # format_within calls still running after their budget ran out
+        self._background = set()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def generate(self, payload):
+        """Async version of GeminiClient.generate."""
+        key, cached = self._cached(payload)
+        if cached is not None:
+            return cached
+        return await self._generate(key, payload)
+
+    async def format(self, payload):
+        """Async version of GeminiClient.format."""
+        try:
+            return await self.generate(payload)
+        except GeminiError as e:
+            return str(e)
+
+    def _forget(self, task):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()  # a late failure was already counted; don't log it as unretrieved
+
+    async def format_within(self, payload, budget_seconds, fallback):
+        """Async version of GeminiClient.format_within."""
+        key, cached = self._cached(payload)
+        if cached is not None:
+            return cached
+        if self._skip_llm(budget_seconds) or len(self._background) >= self.pool_size:
+            return self._fallback(payload, fallback)
+
+        task = asyncio.ensure_future(self._generate(key, payload))
+        self._background.add(task)
+        task.add_done_callback(self._forget)
+        try:
+            # shield: running out of budget must not cancel the call
+            return await asyncio.wait_for(asyncio.shield(task), budget_seconds)
+        except (asyncio.TimeoutError, GeminiError):
+            return self._fallback(payload, fallback)
+
+    async def _generate(self, key, payload):
+        start = time.perf_counter()
+        body = self.request_body(payload)
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self.client.post(self.generate_url(), json=body)
+            except self._httpx.TransportError as e:
+                if not last_attempt:
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+                    continue
+                self._count("misses", time.perf_counter() - start)
+                self._count("errors")
+                raise GeminiError(f"Error from Gemini: {type(e).__name__}") from e
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                continue
+            break
+        self._count("misses", time.perf_counter() - start)
+        return self._finish_format(key, response.status_code, response.text, response.json)
+
+    async def stream(self, payload):
+        """Async version of GeminiClient.stream (the stream itself is not retried)."""
+        key, cached = self._cached(payload)
+        if cached is not None:
+            yield self._cached_text(cached)
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        try:
+            async with self.client.stream("POST", self.stream_url(), json=self.request_body(payload)) as response:
+                if response.status_code != 200:
+                    text = (await response.aread()).decode(errors="replace")
+                    raise GeminiError(f"Error from Gemini: {response.status_code} {text}")
+                async for line in response.aiter_lines():
+                    text = self._stream_text(line)
+                    if text:
+                        chunks.append(text)
+                        yield text
+        except self._httpx.HTTPError as e:
+            self._count("errors")
+            raise GeminiError(f"Error from Gemini: {type(e).__name__}") from e
+        except GeminiError:
+            self._count("errors")
+            raise
+        finally:
+            self._count("misses", time.perf_counter() - start)
+
+        self._finish_stream(key, chunks)
+
+    async def _pump_stream(self, payload, chunks):
+        try:
+            async for text in self.stream(payload):
+                chunks.put_nowait(text)
+            chunks.put_nowait(_STREAM_END)
+        except GeminiError as e:
+            chunks.put_nowait(e)
+
+    async def stream_within(self, payload, budget_seconds, fallback):
+        """Async version of GeminiClient.stream_within."""
+        key, cached = self._cached(payload)
+        if cached is not None:
+            yield "delta", self._cached_text(cached)
+            return
+        if self._skip_llm(budget_seconds) or len(self._background) >= self.pool_size:
+            yield "delta", self._fallback(payload, fallback)
+            return
+
+        chunks = asyncio.Queue()
+        task = asyncio.ensure_future(self._pump_stream(payload, chunks))
+        self._background.add(task)
+        task.add_done_callback(self._forget)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_seconds
+        sent_text, finish_in_background = False, False
+        try:
+            while True:
+                if sent_text:
+                    item = await chunks.get()
+                else:
+                    try:
+                        item = await asyncio.wait_for(chunks.get(), max(0.0, deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        finish_in_background = True
+                        yield "delta", self._fallback(payload, fallback)
+                        return
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, GeminiError):
+                    yield ("replace" if sent_text else "delta"), self._fallback(payload, fallback)
+                    return
+                sent_text = True
+                yield "delta", item
+        finally:
+            if not finish_in_background:
+                task.cancel()
+        if not sent_text:
+            yield "delta", self._fallback(payload, fallback)
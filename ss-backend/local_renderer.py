@@ -0,0 +1,102 @@
+"""
+Deterministic, local version of the Gemini-formatted /predict_from_text
+answer. It builds the same sections the prompt asks for (see
+llm_client.build_prompt) from the {"parsed_data", "prediction"} payload
+with plain string templates, so it needs no network and takes a few
+microseconds. It is served whenever the LLM is too slow, failing or not
+configured.
+"""
+DISCLAIMER = (
+    "This analysis is based solely on the provided data and should not be considered a definitive "
+    "diagnosis or prediction. Professional medical and psychological evaluation is essential for a "
+    "comprehensive assessment and personalized recommendations."
+)
+
+CLASS_TEXT = {
+    0: ("Low", "The reported substance is not one of the high-risk groups in our data, so the model "
+               "places this profile in the lowest overdose-risk class."),
+    1: ("Medium", "Alcohol is the most common substance in our incident data. It carries a moderate "
+                  "overdose risk, especially in large amounts or combined with other substances."),
+    2: ("High", "Opioids, crystal meth and cocaine are associated with the most serious overdose "
+                "incidents in our data, so this profile falls in the highest risk class."),
+}
+
+CONFIDENCE_TEXT = {
+    "High": "The model's probability for this class is above 70%, so similar profiles in the data "
+            "very often match this outcome.",
+    "Medium": "The model's probability for this class is between 40% and 70%. Similar profiles often, "
+              "but not always, match this outcome.",
+    "Low": "The model's probability for this class is 40% or less. Similar profiles in the data vary "
+           "widely, so treat this estimate with caution.",
+}
+
+UNKNOWN_VALUES = {"", "unknown", "none"}
+
+
+def _display(value):
+    value = str(value or "").strip()
+    if value.lower() in UNKNOWN_VALUES:
+        return "Not specified"
+    return " ".join(word[:1].upper() + word[1:] for word in value.split(" "))
+
+
+def _display_age(age):
+    parts = str(age or "").split(" to ")
+    if len(parts) == 2 and parts[0] == parts[1]:
+        return parts[0]
+    return _display(age)
+
+
+def _risk_factors(parsed, prediction):
+    factors = []
+    if prediction.get("overdose_class") == 2:
+        factors.append(f"{_display(parsed.get('Substance'))} is a high-risk substance for overdose.")
+    try:
+        if int(_display_age(parsed.get("Age"))) < 18:
+            factors.append("The person is under 18; young people are especially vulnerable to harm "
+                           "from substance use.")
+    except ValueError:
+        pass
+    if prediction.get("confidence") == "High":
+        factors.append("The model's probability for this risk class is high.")
+    return factors or ["No specific high-risk factors were identified in the input."]
+
+
+def render_markdown(payload):
+    """Markdown summary of a {"parsed_data", "prediction"} payload."""
+    parsed = payload.get("parsed_data") or {}
+    prediction = payload.get("prediction") or {}
+    overdose_class = prediction.get("overdose_class", 0)
+    class_name, class_text = CLASS_TEXT.get(overdose_class, CLASS_TEXT[0])
+    confidence = prediction.get("confidence", "Low")
+    probability = float(prediction.get("overdose_probability") or 0.0)
+
+    lines = [
+        "**Attributes**",
+        "",
+        f"- **Age:** {_display_age(parsed.get('Age'))}",
+        f"- **Location:** {_display(parsed.get('Neighborhood'))}",
+        f"- **Gender:** {_display(parsed.get('Gender'))}",
+        f"- **Substance:** {_display(parsed.get('Substance'))}",
+        "",
+        f"**Overdose Probability:** **{probability:.0%}**",
+        "",
+        f"**Risk Class: {class_name} ({overdose_class})**",
+        "",
+        class_text,
+        "",
+        f"**Confidence: {confidence}**",
+        "",
+        CONFIDENCE_TEXT.get(confidence, CONFIDENCE_TEXT["Low"]),
+        "",
+        "**Risk Factors**",
+        "",
+    ]
+    lines += [f"- {factor}" for factor in _risk_factors(parsed, prediction)]
+    lines += ["", "---", f"*{DISCLAIMER}*"]
+    return "\n".join(lines)
+
+
+def render_formatted(payload):
+    """render_markdown in the same shape as Gemini's candidate content."""
+    return {"parts": [{"text": render_markdown(payload)}], "role": "model"}
@@ -0,0 +1,198 @@
+"""
+In-process latency and request metrics, rendered in the Prometheus text
+format for the /metrics route.
+
+    with metrics.span("predict_proba"):
+        ...
+
+times a stage with the monotonic clock, adds it to that stage's histogram
+and, if a request is being tracked (start_request), to the request's list
+of timings for the Server-Timing header. An exception leaving the block
+counts as an error for the stage. When metrics are disabled, span()
+returns one shared no-op context manager and nothing is recorded.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from 50us (risk-table lookups) to 10s (LLM calls)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a running sum, safe to observe from any thread."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.total += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # GeneratorExit/CancelledError (a client going away) aren't stage errors
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        self.metrics.record(self.stage, time.perf_counter() - self.started, error=error)
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """
+    Stage and request histograms plus request/error counters for one
+    process. Collectors registered with add_collector are called at render
+    time and return extra (name, type, help, [(labels, value), ...]) series.
+    """
+
+    def __init__(self, enabled=True, prefix="app", buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = buckets
+        self._stages = {}
+        self._requests = {}
+        self._request_counts = {}
+        self._stage_errors = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def _increment(self, table, key):
+        with self._lock:
+            table[key] = table.get(key, 0) + 1
+
+    # Hot path ---------------------------------------------------------
+    def span(self, stage):
+        if not self.enabled:
+            return NOOP_SPAN
+        return _Span(self, stage)
+
+    def record(self, stage, seconds, error=False):
+        self._histogram(self._stages, stage).observe(seconds)
+        if error:
+            self._increment(self._stage_errors, stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    def start_request(self):
+        """Starts collecting this request's spans; returns a token for finish_request."""
+        if not self.enabled:
+            return None
+        timings = []
+        _request_timings.set(timings)
+        return timings, time.perf_counter()
+
+    def finish_request(self, token, route, method, status):
+        """
+        Records the request and returns its [(stage, seconds), ...] timings.
+        The timings come from the token, not the context variable, because
+        ASGI servers may send the response from a task with a copied context.
+        """
+        if token is None:
+            return []
+        timings, started = token
+        _request_timings.set(None)
+        self._histogram(self._requests, route).observe(time.perf_counter() - started)
+        self._increment(self._request_counts, (route, method, str(status)))
+        return timings
+
+    # Exposition --------------------------------------------------------
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def _histogram_lines(self, name, table, label):
+        lines = []
+        for key, histogram in sorted(table.items()):
+            counts, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(**{label: key, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_labels(**{label: key})} {total}")
+            lines.append(f"{name}_count{_labels(**{label: key})} {cumulative}")
+        return lines
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        p = self.prefix
+        with self._lock:
+            stages, requests = dict(self._stages), dict(self._requests)
+            request_counts, stage_errors = dict(self._request_counts), dict(self._stage_errors)
+
+        lines = [f"# HELP {p}_stage_duration_seconds Time spent in each request stage.",
+                 f"# TYPE {p}_stage_duration_seconds histogram"]
+        lines += self._histogram_lines(f"{p}_stage_duration_seconds", stages, "stage")
+        lines += [f"# HELP {p}_stage_errors_total Stages that raised an exception.",
+                  f"# TYPE {p}_stage_errors_total counter"]
+        lines += [f"{p}_stage_errors_total{_labels(stage=stage)} {count}"
+                  for stage, count in sorted(stage_errors.items())]
+        lines += [f"# HELP {p}_request_duration_seconds Time to produce each response, by route.",
+                  f"# TYPE {p}_request_duration_seconds histogram"]
+        lines += self._histogram_lines(f"{p}_request_duration_seconds", requests, "route")
+        lines += [f"# HELP {p}_requests_total Responses by route, method and status.",
+                  f"# TYPE {p}_requests_total counter"]
+        lines += [f"{p}_requests_total{_labels(route=route, method=method, status=status)} {count}"
+                  for (route, method, status), count in sorted(request_counts.items())]
+
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines += [f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} {kind}"]
+                lines += [f"{p}_{name}{_labels(**labels)} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(timings):
+    """Server-Timing header value for [(stage, seconds), ...] (repeated stages are summed)."""
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in totals.items())
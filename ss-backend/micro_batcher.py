@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """
+    Coalesces single-item requests into batches for a vectorized scorer.
+
+    submit() queues an item and returns a Future. A background thread takes
+    the first waiting item, keeps collecting until window_ms has passed
+    since it arrived (and the queue is drained) or max_batch_size items are
+    in hand, then calls score_batch(items) once and resolves each caller's
+    Future with its own entry of the returned list (or the exception, if
+    the call raised). score_batch runs in the background thread's context,
+    not the callers', so context variables they set aren't visible to it.
+    """
+
+    def __init__(self, score_batch, window_ms=2.0, max_batch_size=64):
+        self.score_batch = score_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._size_counts = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._score_total = 0.0
+
+    def _ensure_started(self):
+        # Started lazily so forked worker processes each get their own thread
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((time.monotonic(), item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][0] + self.window
+        while len(batch) < self.max_batch_size:
+            # Past the window, still take whatever has already queued up
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            items = [item for _, item, _ in batch]
+            try:
+                results = self.score_batch(items)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            self._record(batch, started, time.monotonic() - started)
+
+    def _record(self, batch, started, score_seconds):
+        waits = [started - submitted for submitted, _, _ in batch]
+        size = len(batch)
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), BATCH_SIZE_BUCKETS[-1])
+        with self._stats_lock:
+            self._batches += 1
+            self._items += size
+            self._size_counts[bucket] += 1
+            self._wait_total += sum(waits)
+            self._wait_max = max(self._wait_max, max(waits))
+            self._score_total += score_seconds
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": items / batches if batches else 0.0,
+                # Count of batches whose size was <= each bucket (and above the previous one)
+                "batch_size_buckets": {str(b): n for b, n in self._size_counts.items()},
+                "queue_wait_ms_avg": self._wait_total / items * 1000.0 if items else 0.0,
+                "queue_wait_ms_max": self._wait_max * 1000.0,
+                "score_ms_avg": self._score_total / batches * 1000.0 if batches else 0.0,
+                "queue_depth": self._queue.qsize(),
+            }
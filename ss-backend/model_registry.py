@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from features import FeatureIndex
+from forest_compiler import COMPILED_DIR, CompiledModel, export_compiled, sample_inputs, verify_compiled
+from risk_table import build_risk_table, load_risk_table, verify_risk_table
+
+MODEL_FILE = "model_calibrated.pkl"
+FEATURES_FILE = "feature_cols.pkl"
+FEATURES_JSON_FILE = "feature_cols.json"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+class LargeBatchModel:
+    """
+    The version's pickled scikit-learn model, loaded the first time a batch
+    of at least min_rows arrives. The compiled evaluator wins below ~1000
+    rows (no per-call overhead) but sklearn's Cython traversal is about
+    twice as fast on 5000-10000 row batches.
+    """
+
+    def __init__(self, path, min_rows):
+        self.path = path
+        self.min_rows = min_rows
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_model(self.path, "sklearn")
+                    print(f"Loaded the sklearn model from {self.path} for batches of {self.min_rows}+ rows")
+        return self._model
+
+
+class ModelBundle(NamedTuple):
+    """
+    Everything needed to score a request with one model version.
+    Bundles are never mutated; a new version produces a new bundle.
+    """
+    version: str
+    model: object
+    feature_cols: tuple
+    features: FeatureIndex
+    risk_table: object
+    path: str
+    loaded_at: float
+    large_batch_model: object = None
+
+    def predict_proba(self, X):
+        """predict_proba on an encoded feature matrix (see FeatureIndex.encode)."""
+        model = self.model
+        if self.large_batch_model is not None and len(X) >= self.large_batch_model.min_rows:
+            model = self.large_batch_model.get()
+        if getattr(model, "feature_names_in_", None) is not None:
+            import pandas as pd
+
+            X = pd.DataFrame(X, columns=self.feature_cols)
+        return model.predict_proba(X)
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat(),
+            "feature_count": len(self.feature_cols),
+            "risk_table": self.risk_table is not None,
+            "backend": type(self.model).__name__,
+            "large_batch_rows": self.large_batch_model.min_rows if self.large_batch_model else None,
+        }
+
+
+# --------------------------------------------------------------------
+# Publishing (called by train_model_expanded.train_and_save_model)
+# --------------------------------------------------------------------
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def publish_model(model, feature_cols, models_dir="models", version=None, risk_table=True):
+    """
+    Writes the model and its feature columns into models_dir/<version>/,
+    exports and verifies the compiled NumPy form of the model, precomputes
+    and verifies its risk table, and then points models_dir/CURRENT at
+    that version. The pointer is replaced atomically,
+    so readers see either the old version or the new one.
+    """
+    import joblib
+
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    version_dir = os.path.join(models_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    joblib.dump(model, os.path.join(version_dir, MODEL_FILE))
+    joblib.dump(list(feature_cols), os.path.join(version_dir, FEATURES_FILE))
+    with open(os.path.join(version_dir, FEATURES_JSON_FILE), "w") as f:
+        json.dump(list(feature_cols), f)
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_file": MODEL_FILE,
+        "features_file": FEATURES_FILE,
+        "compiled_dir": COMPILED_DIR,
+    }
+    _write_atomic(os.path.join(version_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+    bundle = load_bundle(version_dir, version, use_risk_table=False)
+    compiled = CompiledModel.load(export_compiled(model, os.path.join(version_dir, COMPILED_DIR)))
+    verify_compiled(model, compiled, sample_inputs(bundle.features))
+    if risk_table:
+        verify_risk_table(bundle, build_risk_table(bundle, version_dir))
+
+    _write_atomic(os.path.join(models_dir, CURRENT_FILE), version)
+    return version_dir
+
+
+# --------------------------------------------------------------------
+# Loading
+# --------------------------------------------------------------------
+# joblib, pandas and scikit-learn are only imported when a pickle has to
+# be read, so a worker serving the compiled backend starts on NumPy alone.
+def load_model(path, backend="sklearn"):
+    """
+    The pickled scikit-learn model, or with backend="compiled" its
+    memory-mapped NumPy export (falling back to the pickle for versions
+    published without one).
+    """
+    compiled_path = os.path.join(path, COMPILED_DIR)
+    if backend == "compiled" and os.path.isdir(compiled_path):
+        return CompiledModel.load(compiled_path)
+    import joblib
+
+    return joblib.load(os.path.join(path, MODEL_FILE))
+
+
+def load_feature_cols(path):
+    json_path = os.path.join(path, FEATURES_JSON_FILE)
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            return tuple(json.load(f))
+    import joblib
+
+    return tuple(joblib.load(os.path.join(path, FEATURES_FILE)))
+
+
+def load_bundle(path, version, use_risk_table=True, backend="sklearn", large_batch_rows=0):
+    """
+    With backend="compiled" and large_batch_rows > 0, batches of at least
+    that many rows are scored by the pickled model instead (see
+    LargeBatchModel).
+    """
+    model = load_model(path, backend)
+    feature_cols = load_feature_cols(path)
+    table = load_risk_table(path) if use_risk_table else None
+    large_batch_model = None
+    if large_batch_rows > 0 and isinstance(model, CompiledModel) and os.path.exists(os.path.join(path, MODEL_FILE)):
+        large_batch_model = LargeBatchModel(path, large_batch_rows)
+    return ModelBundle(version, model, feature_cols, FeatureIndex(feature_cols), table,
+                       os.path.abspath(path), time.time(), large_batch_model)
+
+
+class ModelRegistry:
+    """
+    Holds the active ModelBundle for this process.
+
+    The CURRENT pointer is re-checked at most once every poll_seconds from
+    get(). When it names a new version, the caller that noticed loads it and
+    swaps the reference; everyone else keeps using the bundle they already
+    hold, so in-flight requests finish on the version they started with.
+
+    If models_dir has no CURRENT pointer, the legacy model_calibrated.pkl and
+    feature_cols.pkl in fallback_dir are served as version "legacy".
+    With use_risk_table, a version's precomputed risk table (if any) is
+    memory-mapped alongside the model. backend="compiled" serves the
+    memory-mapped NumPy export of the model instead of unpickling the
+    scikit-learn object, so worker processes share its pages; batches of
+    large_batch_rows or more still go to the scikit-learn model, which is
+    only unpickled when the first such batch arrives.
+    """
+
+    def __init__(self, models_dir="models", fallback_dir=".", poll_seconds=30.0, use_risk_table=True,
+                 backend="sklearn", large_batch_rows=0):
+        self.models_dir = models_dir
+        self.fallback_dir = fallback_dir
+        self.poll_seconds = poll_seconds
+        self.use_risk_table = use_risk_table
+        self.backend = backend
+        self.large_batch_rows = large_batch_rows
+        self._bundle = None
+        self._swap_lock = threading.Lock()
+        self._last_check = 0.0
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.models_dir, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _load_version(self, version):
+        if version is None:
+            return load_bundle(self.fallback_dir, "legacy", self.use_risk_table, self.backend,
+                               self.large_batch_rows)
+        return load_bundle(os.path.join(self.models_dir, version), version, self.use_risk_table,
+                           self.backend, self.large_batch_rows)
+
+    def reload(self):
+        """Loads whatever CURRENT points at now and makes it active."""
+        with self._swap_lock:
+            bundle = self._load_version(self._current_version())
+            self._bundle = bundle
+            self._last_check = time.monotonic()
+        print(f"Model version {bundle.version} loaded from {bundle.path}")
+        return bundle
+
+    def _maybe_refresh(self):
+        # Only one thread checks/loads; the rest carry on with the old bundle.
+        if not self._swap_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_check = time.monotonic()
+            version = self._current_version()
+            if version is None or version == self._bundle.version:
+                return
+            try:
+                bundle = self._load_version(version)
+            except Exception as e:
+                print(f"Failed to load model version {version}: {e}")
+                return
+            self._bundle = bundle
+            print(f"Model version {bundle.version} swapped in from {bundle.path}")
+        finally:
+            self._swap_lock.release()
+
+    def get(self):
+        if self._bundle is None:
+            return self.reload()
+        if self.poll_seconds >= 0 and time.monotonic() - self._last_check >= self.poll_seconds:
+            self._maybe_refresh()
+        return self._bundle
+
+    def info(self):
+        return self.get().info()
@@ -0,0 +1,116 @@
+"""
+Renders the charts for a training run's evaluation bundle (evaluation.py):
+confusion_matrix.png and model_analysis.png, plus the printed
+classification report. matplotlib and seaborn are imported here only, so
+training never loads them and reports can be regenerated at any time.
+
+    python report.py                          # the version models/CURRENT points at
+    python report.py models/<version> --out reports/
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from evaluation import load_evaluation
+from model_registry import CURRENT_FILE
+
+RISK_MAP = {0: 'Low', 1: 'Medium', 2: 'High'}
+
+
+def current_version_dir(models_dir="models"):
+    with open(os.path.join(models_dir, CURRENT_FILE)) as f:
+        return os.path.join(models_dir, f.read().strip())
+
+
+def format_classification_report(report):
+    """Text table for a classification_report(output_dict=True) dict."""
+    lines = [f"{'':>14}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}"]
+    for label, scores in report.items():
+        if label == "accuracy":
+            lines.append(f"{'accuracy':>14}{'':>10}{'':>10}{scores:>10.2f}")
+            continue
+        lines.append(f"{label:>14}{scores['precision']:>10.2f}{scores['recall']:>10.2f}"
+                     f"{scores['f1-score']:>10.2f}{scores['support']:>10g}")
+    return "\n".join(lines)
+
+
+def render_reports(bundle_dir, out_dir="."):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    evaluation = load_evaluation(bundle_dir)
+    summary = evaluation.summary
+    os.makedirs(out_dir, exist_ok=True)
+    print("\nClassification Report:")
+    print(format_classification_report(summary["classification_report"]))
+
+    # Confusion matrix
+    plt.figure(figsize=(8, 6))
+    sns.heatmap(evaluation.confusion_matrix, annot=True, fmt='g', cmap='Blues')
+    plt.title('Confusion Matrix')
+    plt.ylabel('True Label')
+    plt.xlabel('Predicted Label')
+    plt.savefig(os.path.join(out_dir, 'confusion_matrix.png'))
+
+    # Visualizations, with one row per test incident
+    rows = evaluation.expanded()
+    df_test_merged = pd.DataFrame({
+        'AgeNumeric': evaluation.age_numeric[rows],
+        'GenderNum': evaluation.gender_num[rows],
+        'PredictedRisk': evaluation.y_pred[rows],
+        'ActualRisk': evaluation.y_test[rows]
+    })
+    df_test_merged['PredictedRiskCategory'] = df_test_merged['PredictedRisk'].map(RISK_MAP)
+    df_test_merged['ActualRiskCategory'] = df_test_merged['ActualRisk'].map(RISK_MAP)
+    importance_df = pd.DataFrame({
+        "Feature": summary["feature_cols"],
+        "Importance": evaluation.importances
+    }).sort_values(by="Importance", ascending=False)
+
+    plt.figure(figsize=(12, 8))
+
+    plt.subplot(2, 2, 1)
+    sns.boxplot(x='PredictedRiskCategory', y='AgeNumeric', data=df_test_merged)
+    plt.title('Age vs Predicted Risk')
+
+    plt.subplot(2, 2, 2)
+    sns.countplot(x='ActualRiskCategory', hue='PredictedRiskCategory', data=df_test_merged)
+    plt.title('Actual vs Predicted Risk')
+
+    plt.subplot(2, 2, 3)
+    top_features = importance_df.head(10)
+    sns.barplot(x='Importance', y='Feature', data=top_features)
+    plt.title('Top 10 Feature Importance')
+
+    plt.tight_layout()
+    plt.savefig(os.path.join(out_dir, 'model_analysis.png'))
+    plt.close('all')
+    print(f"Analysis visualizations saved in {os.path.abspath(out_dir)}")
+
+
+def render_in_background(bundle_dir, out_dir=".", log_path=None):
+    """Starts `python report.py bundle_dir --out out_dir` detached; returns the Popen."""
+    log_path = log_path or os.path.join(bundle_dir, "report.log")
+    with open(log_path, "w") as log:
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), bundle_dir, "--out", out_dir],
+            stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("bundle_dir", nargs="?", help="a models/<version> directory (default: CURRENT)")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--out", default=".", help="where to write the PNGs")
+    args = parser.parse_args()
+
+    render_reports(args.bundle_dir or current_version_dir(args.models_dir), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+TABLE_FILE = "risk_table.npy"
+INDEX_FILE = "risk_table.json"
+
+# parse_age only ever yields integers; anything outside this range is
+# scored by the live model instead.
+AGE_MIN = 0
+AGE_MAX = 120
+
+
+class RiskTable:
+    """
+    predict_proba for every (age, gender, neighbourhood, substance) input
+    make_prediction can build, stored as a 5-d array:
+
+        probs[age - age_min, gender_num, neigh_slot, subst_slot, class]
+
+    Slot 0 of the neighbourhood/substance axes is "no matching column";
+    slot i + 1 is the i-th neigh_/subst_ column of the model.
+    """
+
+    def __init__(self, probs, index):
+        self.probs = probs
+        self.age_min = index["age_min"]
+        self.age_max = index["age_max"]
+        self.classes = index["classes"]
+        self.neigh_slot = {c: i + 1 for i, c in enumerate(index["neigh_cols"])}
+        self.subst_slot = {c: i + 1 for i, c in enumerate(index["subst_cols"])}
+
+    def lookup(self, age_numeric, gender_num, neigh_str, subst_str):
+        """Class probabilities for one input, or None if it is outside the table."""
+        if not self.age_min <= age_numeric <= self.age_max:
+            return None
+        neigh = self.neigh_slot.get(f"neigh_{neigh_str.lower()}", 0)
+        subst = self.subst_slot.get(f"subst_{subst_str.lower()}", 0)
+        return self.probs[age_numeric - self.age_min, gender_num, neigh, subst]
+
+
+def _grid_axes(feature_index, age_min, age_max):
+    ages = np.arange(age_min, age_max + 1)
+    genders = np.arange(2)
+    neigh = np.array([-1] + [feature_index.neigh_pos[c] for c in feature_index.neigh_cols])
+    subst = np.array([-1] + [feature_index.subst_pos[c] for c in feature_index.subst_cols])
+    return ages, genders, neigh, subst
+
+
+def build_risk_table(bundle, out_dir, age_min=AGE_MIN, age_max=AGE_MAX, batch_size=20000):
+    """
+    Scores the whole input grid with bundle.predict_proba in batches and
+    writes risk_table.npy plus its index maps into out_dir.
+    """
+    feature_index = bundle.features
+    ages, genders, neigh, subst = _grid_axes(feature_index, age_min, age_max)
+    shape = (len(ages), len(genders), len(neigh), len(subst))
+    classes = [int(c) for c in bundle.model.classes_]
+
+    # Every grid cell as one row, in C order of `shape`
+    grid = np.stack(np.meshgrid(ages, genders, neigh, subst, indexing="ij"), axis=-1).reshape(-1, 4)
+    probs = np.empty((grid.shape[0], len(classes)), dtype=np.float64)
+    for start in range(0, grid.shape[0], batch_size):
+        chunk = grid[start:start + batch_size]
+        X = feature_index.encode(chunk[:, 0], chunk[:, 1], chunk[:, 2], chunk[:, 3])
+        probs[start:start + batch_size] = bundle.predict_proba(X)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, TABLE_FILE), probs.reshape(shape + (len(classes),)))
+    index = {
+        "version": bundle.version,
+        "age_min": int(age_min),
+        "age_max": int(age_max),
+        "classes": classes,
+        "neigh_cols": feature_index.neigh_cols,
+        "subst_cols": feature_index.subst_cols,
+    }
+    with open(os.path.join(out_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    print(f"Risk table with {grid.shape[0]} cells written to {out_dir}")
+    return load_risk_table(out_dir)
+
+
+def load_risk_table(path):
+    """Memory-maps the table in path, or returns None if there isn't one."""
+    table_path = os.path.join(path, TABLE_FILE)
+    if not os.path.exists(table_path):
+        return None
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        index = json.load(f)
+    return RiskTable(np.load(table_path, mmap_mode="r"), index)
+
+
+def verify_risk_table(bundle, table, samples=2000, seed=0, atol=1e-12):
+    """
+    Re-scores a random sample of grid cells with the live model and raises
+    ValueError if any of them disagree with the table.
+    """
+    feature_index = bundle.features
+    ages, genders, neigh, subst = _grid_axes(feature_index, table.age_min, table.age_max)
+    rng = np.random.default_rng(seed)
+    idx = [rng.integers(0, len(axis), samples) for axis in (ages, genders, neigh, subst)]
+    X = feature_index.encode(ages[idx[0]], genders[idx[1]], neigh[idx[2]], subst[idx[3]])
+    live = bundle.predict_proba(X)
+    stored = table.probs[idx[0], idx[1], idx[2], idx[3]]
+    max_diff = float(np.max(np.abs(live - stored))) if samples else 0.0
+    if max_diff > atol:
+        raise ValueError(f"Risk table disagrees with the live model (max diff {max_diff})")
+    print(f"Risk table verified against {samples} live predictions (max diff {max_diff})")
+    return max_diff
+
+
+if __name__ == "__main__":
+    # Rebuild and verify the table for an existing model version directory
+    from model_registry import load_bundle
+
+    path = sys.argv[1]
+    bundle = load_bundle(path, os.path.basename(os.path.normpath(path)))
+    verify_risk_table(bundle, build_risk_table(bundle, path))
@@ -0,0 +1,84 @@
+import re
+
+# Vocabularies the extractor (and the model's one-hot columns) know about
+all_neighborhoods = ["Agassiz", "Airport", "Alpine Place", "Amber Trails", "Archwood", "Armstrong Point", "Assiniboia Downs", "Assiniboine Park", "Beaumont", "Betsworth", "Birchwood", "Booth", "Bridgwater Centre", "Bridgwater Forest", "Bridgwater Lakes", "Bridgwater Trails", "Broadway-Assiniboine", "Brockville", "Brooklands", "Bruce Park", "Buchanan", "Buffalo", "Burrows Central", "Burrows-Keewatin", "Canterbury Park", "Centennial", "Central Park", "Central River Heights", "Central St. Boniface", "Chalmers", "Chevrier", "China Town", "Civic Centre", "Cloutier Drive", "Colony", "Crescent Park", "Crescentwood", "Crestview", "Dakota Crossing", "Daniel McIntyre", "Daniel Mcintyre", "Deer Lodge", "Dufferin", "Dufferin Industrial", "Dufresne", "Dugald", "Eaglemere", "Earl Grey", "East Elmwood", "Ebby-Wentworth", "Edgeland", "Elm Park", "Elmhurst", "Eric Coy", "Exchange District", "Fairfield Park", "Fort Richmond", "Fraipont", "Garden City", "Glendale", "Glenelm", "Glenwood", "Grant Park", "Grassie", "Heritage Park", "Holden", "Inkster Gardens", "Inkster Industrial Park", "Inkster-Faraday", "Island Lakes", "J. B. Mitchell", "Jameswood", "Jefferson", "Kensington", "Kern Park", "Kil-Cona Park", "Kildare-Redonda", "Kildonan Crossing", "Kildonan Drive", "Kildonan Park", "King Edward", "Kingston Crescent", "Kirkfield", "La Barriere", "Lavalee", "Legislature", "Leila North", "Leila-McPhillips Triangle", "Leila-Mcphillips Triangle", "Linden Ridge", "Linden Woods", "Logan-C.P.R.", "Lord Roberts", "Lord Selkirk Park", "Luxton", "Maginot", "Mandalay West", "Maple Grove Park", "Margaret Park", "Marlton", "Mathers", "Maybank", "McLeod Industrial", "McMillan", "Mcleod Industrial", "Mcmillan", "Meadowood", "Meadows", "Melrose", "Minnetonka", "Minto", "Mission Gardens", "Mission Industrial", "Montcalm", "Munroe East", "Munroe West", "Murray Industrial Park", "Mynarski", "Niakwa Park", "Niakwa Place", "Norberry", "Normand Park", "North Inkster Industrial", "North Point Douglas", "North River Heights", "North St. Boniface", "North Transcona Yards", "Norwood East", "Norwood West", "Oak Point Highway", "Old Tuxedo", "Omand's Creek Industrial", "Pacific Industrial", "Parc La Salle", "Parker", "Peguis", "Pembina Strip", "Perrault", "Point Road", "Polo Park", "Portage & Main", "Portage-Ellice", "Prairie Pointe", "Pulberry", "Radisson", "Regent", "Richmond Lakes", "Richmond West", "Ridgedale", "Ridgewood South", "River East", "River Park South", "River West Park", "River-Osborne", "Riverbend", "Rivergrove", "Riverview", "Robertson", "Roblin Park", "Rockwood", "Roslyn", "Rosser-Old Kildonan", "Rossmere-A", "Rossmere-B", "Royalwood", "Sage Creek", "Sargent Park", "Saskatchewan North", "Seven Oaks", "Shaughnessy Park", "Silver Heights", "Sir John Franklin", "South Point Douglas", "South Pointe", "South Portage", "South River Heights", "South Tuxedo", "Southboine", "Southdale", "Southland Park", "Spence", "Springfield North", "Springfield South", "St. Boniface Industrial Park", "St. George", "St. James Industrial", "St. John's", "St. John's Park", "St. Matthews", "St. Norbert", "St. Vital Centre", "St. Vital Perimeter South", "Stock Yards", "Sturgeon Creek", "Symington Yards", "Talbot-Grey", "Templeton-Sinclair", "The Forks", "The Maples", "Tissot", "Transcona North", "Transcona South", "Transcona Yards", "Trappistes", "Turnbull Drive", "Tuxedo", "Tuxedo Industrial", "Tyndall Park", "Tyne-Tees", "University", "Valhalla", "Valley Gardens", "Varennes", "Varsity View", "Vialoux", "Victoria Crescent", "Victoria West", "Vista", "Waverley Heights", "Wellington Crescent", "West Alexander", "West Broadway", "West Fort Garry Industrial", "West Kildonan Industrial", "West Wolseley", "Westdale", "Weston", "Weston Shops", "Westwood", "Whyte Ridge", "Wildwood", "Wilkes South", "William Whyte", "Windsor Park", "Wolseley", "Woodhaven", "Worthington"]
+all_substances = ["Alcohol", "Cocaine", "Crystal Meth", "Marijuana", "Opioids"]
+
+AGE_PATTERN = r"(?P<years>\d{1,3})\s?years?\s?old"
+DEFAULT_AGE = "15 to 19"
+
+
+def _trie_pattern(words):
+    """
+    Regex for a set of lowercase words, factored into a prefix trie so the
+    engine does one walk per text position instead of trying every word.
+    A word that is a prefix of a longer one is made optional-greedy, so the
+    longest word wins ("old tuxedo" over "tuxedo", "tuxedo industrial" over
+    "tuxedo").
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node):
+        branches = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return walk(trie)
+
+
+class TextExtractor:
+    """
+    Finds age, gender, neighbourhood and substance in one left-to-right pass
+    over the lowercased text. Each field takes its first occurrence in the
+    text; at a given position the longest name matches. Neighbourhoods must
+    be whole words; substances and gender only need to start a word (so
+    "alcoholic" still finds alcohol, and "female" never reads as "male").
+    Spellings that only differ in case map to the first one in the vocabulary.
+    """
+
+    def __init__(self, neighborhoods, substances):
+        self.neighborhoods = {}
+        for name in neighborhoods:
+            self.neighborhoods.setdefault(name.lower(), name)
+        self.substances = {}
+        for name in substances:
+            self.substances.setdefault(name.lower(), name)
+
+        self.pattern = re.compile(
+            rf"(?P<age>{AGE_PATTERN})"
+            r"|(?<![a-z0-9])(?:"
+            rf"(?P<neigh>{_trie_pattern(self.neighborhoods)})(?![a-z0-9])"
+            rf"|(?P<subst>{_trie_pattern(self.substances)})"
+            r"|(?P<gender>female|male)"
+            r")"
+        )
+
+    def extract(self, user_text):
+        """Returns the parsed_data dict used by /predict_from_text."""
+        found = {}
+        for match in self.pattern.finditer(user_text.lower()):
+            kind = match.lastgroup
+            if kind not in found:
+                found[kind] = match
+                if len(found) == 4:
+                    break
+
+        age = found.get("age")
+        neigh = found.get("neigh")
+        subst = found.get("subst")
+        gender = found.get("gender")
+        return {
+            "Age": f"{age.group('years')} to {age.group('years')}" if age else DEFAULT_AGE,
+            "Gender": gender.group("gender") if gender else "unknown",
+            "Neighborhood": self.neighborhoods[neigh.group("neigh")] if neigh else "unknown",
+            "Substance": self.substances[subst.group("subst")] if subst else "none",
+        }
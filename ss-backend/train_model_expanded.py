@@ -3,82 +3,82 @@ import joblib
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import time
+from contextlib import contextmanager
 from sklearn.calibration import CalibratedClassifierCV
 
-def classify_overdose_risk(substance):
-    substance = substance.lower()  # Convert to lowercase for consistency
-    if substance in ["opioids", "crystal meth", "cocaine"]:
-        return 2  # High risk
-    elif substance == "alcohol":
-        return 1  # Medium risk 
-    else:
-        return 0  # Low risk
+from count_cube import cube_training_matrix, load_cube, split_counts
+from evaluation import write_evaluation
+from fold_training import fit_calibrated_forest
+from model_registry import publish_model
+from training_data import build_training_matrix
 
-def parse_age(age_str):
-    """
-    Convert an age range like '30 to 34' into a numeric midpoint (e.g., 32).
-    If parsing fails, return None.
-    """
-    try:
-        if pd.isna(age_str):
-            return None
-        parts = age_str.split(" to ")
-        low = int(parts[0])
-        high = int(parts[1])
-        return (low + high) // 2
-    except:
-        return None
-
-def train_and_save_model():
-    try:
-        print("Starting the training process...")
-
-        # 1. Load data
-        df = pd.read_csv("Substance_Use_20250301.csv")
-        print(f"Data loaded successfully. Shape: {df.shape}")
-        
-        # 2. Clean + Normalize
-        df["Age"] = df["Age"].fillna("30 to 34").astype(str).str.strip()
-        df["AgeNumeric"] = df["Age"].apply(parse_age)
 
-        df["Gender"] = df["Gender"].fillna("unknown").astype(str).str.lower().str.strip()
-        df["GenderNum"] = df["Gender"].apply(lambda g: 1 if g == "male" else 0)
+class StageTimer:
+    """Wall time per named training stage, printed as a table at the end."""
 
-        df["Neighbourhood"] = df["Neighbourhood"].fillna("none").astype(str).str.lower().str.strip()
-        df["Substance"] = df["Substance"].fillna("none").astype(str).str.lower().str.strip()
+    def __init__(self):
+        self.seconds = {}
 
-        df["OriginalSubstance"] = df["Substance"]
-        df["OriginalNeighbourhood"] = df["Neighbourhood"]
+    @contextmanager
+    def __call__(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - started
 
-        # 3. Target
-        df["IsOverdose"] = df["Substance"].apply(classify_overdose_risk)
-        df = df.dropna(subset=["AgeNumeric"])
+    def report(self):
+        total = sum(self.seconds.values())
+        print("\nStage timings:")
+        for name, seconds in self.seconds.items():
+            print(f"  {name:<14} {seconds:8.2f}s  {seconds / total:6.1%}")
+        print(f"  {'total':<14} {total:8.2f}s")
 
-        # 4. Age group feature
-        df["AgeGroup"] = pd.cut(df["AgeNumeric"], bins=[0, 18, 25, 35, 50, 100], 
-                               labels=["Under18", "YoungAdult", "Adult", "MiddleAge", "Senior"])
 
-        # 5. One-hot encoding
-        df_encoded = pd.get_dummies(df, columns=["AgeGroup", "Neighbourhood"], 
-                                   prefix=["age", "neigh"], drop_first=False)
-
-        # 6. Drop unused columns
-        unwanted_columns = ["Neighbourhood ID", "Incident Number", "Dispatch Date", 
-                            "Patient Number", "Ward", "Age", "Gender", "Substance",
-                            "OriginalSubstance", "OriginalNeighbourhood"]
-        df_encoded = df_encoded.drop(columns=[col for col in unwanted_columns if col in df_encoded.columns])
-
-        # 7. Define features and target
-        feature_cols = ["AgeNumeric", "GenderNum"] + \
-                       [col for col in df_encoded.columns if col.startswith("age_") or col.startswith("neigh_")]
-        X = df_encoded[feature_cols]
-        y = df_encoded["IsOverdose"]
+def train_and_save_model(models_dir="models", cube_path=None, cv_mode="oof", workers=None, report_mode="background"):
+    """
+    Trains on Substance_Use_20250301.csv, or with cube_path on the distinct
+    rows of a count cube (see count_cube.py) weighted by their counts.
+
+    cv_mode="oof" fits the base forest and the three calibration folds in
+    parallel (workers processes) and takes the CV scores from the folds'
+    held-out predictions. cv_mode="refit" is the original sequential path:
+    CalibratedClassifierCV.fit plus a separate 5-fold cross_val_score.
+    Both produce the same calibrated model.
+
+    The test-set evaluation is saved as a bundle in the published version
+    directory; report_mode "background" renders its charts in a separate
+    process, "inline" renders them before returning and "none" skips them.
+    """
+    timer = StageTimer()
+    try:
+        print("Starting the training process...")
 
-        # 8. Train-test split
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, stratify=y, random_state=42)
+        # 1-7. Load, clean and encode (chunked, categorical, sparse one-hot block)
+        with timer("features"):
+            if cube_path:
+                data = cube_training_matrix(load_cube(cube_path))
+            else:
+                data = build_training_matrix("Substance_Use_20250301.csv")
+        feature_cols = data.feature_cols
+        X, y = data.X, data.y
+        print(f"Features built. Shape: {X.shape}, {X.nnz} non-zeros")
+
+        # 8. Train-test split (on row indices, so age/gender stay at hand for the plots)
+        with timer("split"):
+            if data.sample_weight is None:
+                train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.15, stratify=y,
+                                                       random_state=42)
+                w_train = w_test = None
+            else:
+                # Split each distinct row's incidents between train and test
+                train_counts, test_counts = split_counts(data.sample_weight, test_size=0.15, seed=42)
+                train_idx, test_idx = np.flatnonzero(train_counts), np.flatnonzero(test_counts)
+                w_train, w_test = train_counts[train_idx], test_counts[test_idx]
+            X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+        fit_params = {} if w_train is None else {"sample_weight": w_train}
 
         # 9. Base model
         base_model = RandomForestClassifier(
@@ -89,21 +89,40 @@ def train_and_save_model():
             random_state=42,
             class_weight={0: 1, 1: 0.05, 2: 50}
         )
-        base_model.fit(X_train, y_train)
-        print("Base model trained.")
 
-        # 10. Calibration
-        calibrated_model = CalibratedClassifierCV(base_model, method='isotonic', cv=3)
-        calibrated_model.fit(X_train, y_train)
-        print("Calibrated model trained.")
+        if cv_mode == "oof":
+            # 9-10. Base model + calibration folds, fitted in parallel
+            with timer("fit"):
+                folds = fit_calibrated_forest(base_model, X_train, y_train, w_train, cv=3, workers=workers)
+            base_model, calibrated_model, cv_scores = folds.base_model, folds.calibrated_model, folds.cv_scores
+            print("Base model and calibrated model trained. Per-fit seconds: "
+                  + ", ".join(f"{name} {seconds:.2f}" for name, seconds in folds.fit_seconds.items()))
+        else:
+            with timer("base fit"):
+                base_model.fit(X_train, y_train, **fit_params)
+            print("Base model trained.")
+
+            # 10. Calibration
+            with timer("calibration"):
+                calibrated_model = CalibratedClassifierCV(base_model, method='isotonic', cv=3)
+                calibrated_model.fit(X_train, y_train, **fit_params)
+            print("Calibrated model trained.")
 
         # 11. Save calibrated model + features
-        joblib.dump(calibrated_model, "model_calibrated.pkl")
-        joblib.dump(feature_cols, "feature_cols.pkl")
-        print("Calibrated model and features saved.")
+        with timer("publish"):
+            joblib.dump(calibrated_model, "model_calibrated.pkl")
+            joblib.dump(feature_cols, "feature_cols.pkl")
+            version_dir = publish_model(calibrated_model, feature_cols, models_dir)
+        print(f"Calibrated model and features saved. Published to {version_dir}")
 
         # 12. Cross-validation (on uncalibrated model)
-        cv_scores = cross_val_score(base_model, X_train, y_train, cv=5, scoring='f1_weighted')
+        if cv_mode == "oof":
+            print("Cross-validation scores from the 3 calibration folds' held-out predictions")
+        else:
+            # On a cube the folds and scores are per distinct row
+            with timer("cv refits"):
+                cv_scores = cross_val_score(base_model, X_train, y_train, cv=5, scoring='f1_weighted',
+                                            params=fit_params)
         print(f"Cross-validation scores: {cv_scores}")
         print(f"Average CV score: {cv_scores.mean():.4f}")
 
@@ -115,50 +134,41 @@ def train_and_save_model():
         print("\nTop 10 Feature Importances:")
         print(importance_df.head(10))
 
-        # 14. Evaluation
-        y_pred = calibrated_model.predict(X_test)
-        print("\nClassification Report:")
-        print(classification_report(y_test, y_pred))
-
-        # Confusion matrix
-        cm = confusion_matrix(y_test, y_pred)
-        plt.figure(figsize=(8, 6))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-        plt.title('Confusion Matrix')
-        plt.ylabel('True Label')
-        plt.xlabel('Predicted Label')
-        plt.savefig('confusion_matrix.png')
-
-        # 15. Visualizations
-        df_test_merged = pd.DataFrame({
-            'AgeNumeric': X_test['AgeNumeric'],
-            'GenderNum': X_test['GenderNum'],
-            'PredictedRisk': y_pred,
-            'ActualRisk': y_test
-        })
-
-        risk_map = {0: 'Low', 1: 'Medium', 2: 'High'}
-        df_test_merged['PredictedRiskCategory'] = df_test_merged['PredictedRisk'].map(risk_map)
-        df_test_merged['ActualRiskCategory'] = df_test_merged['ActualRisk'].map(risk_map)
-
-        plt.figure(figsize=(12, 8))
-
-        plt.subplot(2, 2, 1)
-        sns.boxplot(x='PredictedRiskCategory', y='AgeNumeric', data=df_test_merged)
-        plt.title('Age vs Predicted Risk')
-
-        plt.subplot(2, 2, 2)
-        sns.countplot(x='ActualRiskCategory', hue='PredictedRiskCategory', data=df_test_merged)
-        plt.title('Actual vs Predicted Risk')
-
-        plt.subplot(2, 2, 3)
-        top_features = importance_df.head(10)
-        sns.barplot(x='Importance', y='Feature', data=top_features)
-        plt.title('Top 10 Feature Importance')
-
-        plt.tight_layout()
-        plt.savefig('model_analysis.png')
-        print("Analysis visualizations saved.")
+        # 14. Evaluation bundle (charts are rendered separately by report.py)
+        with timer("evaluation"):
+            y_pred = calibrated_model.predict(X_test)
+            report = classification_report(y_test, y_pred, sample_weight=w_test, output_dict=True,
+                                           zero_division=0)
+            write_evaluation(
+                version_dir,
+                y_test=y_test,
+                y_pred=y_pred,
+                sample_weight=w_test,
+                age_numeric=data.age_numeric[test_idx],
+                gender_num=data.gender_num[test_idx],
+                confusion_matrix=confusion_matrix(y_test, y_pred, sample_weight=w_test),
+                importances=base_model.feature_importances_,
+                feature_cols=list(feature_cols),
+                cv_mode=cv_mode,
+                cv_scores=cv_scores.tolist(),
+                classification_report=report,
+                stage_seconds=dict(timer.seconds),
+            )
+        print(f"\nTest accuracy {report['accuracy']:.4f}, weighted F1 {report['weighted avg']['f1-score']:.4f}. "
+              f"Evaluation bundle written to {version_dir}")
+
+        # 15. Visualizations, off the training path
+        if report_mode == "background":
+            from report import render_in_background
+
+            render_in_background(version_dir)
+            print("Rendering reports in the background (python report.py to re-render)")
+        elif report_mode == "inline":
+            from report import render_reports
+
+            with timer("report"):
+                render_reports(version_dir)
+        timer.report()
 
         return calibrated_model, feature_cols
 
@@ -169,4 +179,15 @@ def train_and_save_model():
 
 
 if __name__ == "__main__":
-    model, features = train_and_save_model()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--cube", help="train on a count cube (count_cube.py) instead of the CSV")
+    parser.add_argument("--cv-mode", choices=["oof", "refit"], default="oof",
+                        help="oof: parallel fits, CV from calibration folds; refit: original sequential refits")
+    parser.add_argument("--workers", type=int, help="processes for the parallel fits (default TRAIN_WORKERS or CPUs)")
+    parser.add_argument("--report", choices=["background", "inline", "none"], default="background",
+                        help="when to render the evaluation charts (see report.py)")
+    args = parser.parse_args()
+    model, features = train_and_save_model(args.models_dir, args.cube, args.cv_mode, args.workers, args.report)
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Training feature pipeline: Substance_Use CSV -> sparse feature matrix.
+
+The CSV is read in chunks with the four columns the model uses declared as
+categoricals, so each chunk holds one small code array per column plus its
+distinct values. Cleaning, age parsing, gender mapping and the overdose
+label are computed once per distinct value and broadcast through the codes
+instead of row by row. The age-group and neighbourhood one-hot blocks are
+built straight into a scipy CSR matrix whose columns are in exactly the
+order pd.get_dummies produced for feature_cols.pkl:
+
+    AgeNumeric, GenderNum, age_<group> (bin order), neigh_<name> (sorted)
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+USE_COLUMNS = ["Age", "Gender", "Neighbourhood", "Substance"]
+INCIDENT_COLUMN = "Incident Number"
+DEFAULT_AGE = "30 to 34"
+AGE_BINS = [0, 18, 25, 35, 50, 100]
+AGE_LABELS = ["Under18", "YoungAdult", "Adult", "MiddleAge", "Senior"]
+
+
+def classify_overdose_risk(substance):
+    substance = substance.lower()  # Convert to lowercase for consistency
+    if substance in ["opioids", "crystal meth", "cocaine"]:
+        return 2  # High risk
+    elif substance == "alcohol":
+        return 1  # Medium risk
+    else:
+        return 0  # Low risk
+
+def parse_age(age_str):
+    """
+    Convert an age range like '30 to 34' into a numeric midpoint (e.g., 32).
+    If parsing fails, return None.
+    """
+    try:
+        if pd.isna(age_str):
+            return None
+        parts = age_str.split(" to ")
+        low = int(parts[0])
+        high = int(parts[1])
+        return (low + high) // 2
+    except:
+        return None
+
+
+class TrainingMatrix(NamedTuple):
+    X: sp.csr_matrix
+    y: np.ndarray
+    feature_cols: list
+    age_numeric: np.ndarray
+    gender_num: np.ndarray
+    # Rows are distinct combinations weighted by their counts (see count_cube.py)
+    sample_weight: np.ndarray = None
+
+
+class FeatureColumns(NamedTuple):
+    age_numeric: np.ndarray
+    gender_num: np.ndarray
+    neigh_ids: np.ndarray
+    label: np.ndarray
+    neigh_names: list
+    incidents: np.ndarray = None
+
+
+def _per_value(column, fill, fn, dtype):
+    """fn applied to each distinct (cleaned) value of a categorical column, indexed by its codes."""
+    values = column.cat.categories.astype(str).str.strip()
+    mapped = np.array([fn(v) for v in values] + [fn(fill)], dtype=dtype)
+    # Missing values have code -1, which picks the trailing fill entry
+    return mapped[column.cat.codes.to_numpy()]
+
+
+def _age_numeric(age):
+    parsed = parse_age(age)
+    return np.nan if parsed is None else parsed
+
+
+def read_features(csv_path, chunksize=250_000, neigh_names=None, with_incidents=False):
+    """
+    Cleaned per-row columns from the CSV: AgeNumeric (float, NaN when the
+    age can't be parsed), GenderNum, ids into the (unsorted) neighbourhood
+    name list, and the IsOverdose label. Ids continue from neigh_names if
+    given (the list is extended in place). with_incidents also returns the
+    Incident Number of every row, as strings.
+    """
+    ages, genders, neigh_ids, labels, incidents = [], [], [], [], []
+    neigh_names = [] if neigh_names is None else neigh_names
+    neigh_index = {name: i for i, name in enumerate(neigh_names)}
+    dtypes = {column: "category" for column in USE_COLUMNS}
+    usecols = USE_COLUMNS
+    if with_incidents:
+        dtypes[INCIDENT_COLUMN] = str
+        usecols = USE_COLUMNS + [INCIDENT_COLUMN]
+
+    # Neighbourhood names -> ids shared across chunks (each chunk has its own categories)
+    def neigh_id(name):
+        name = name.lower()
+        if name not in neigh_index:
+            neigh_index[name] = len(neigh_names)
+            neigh_names.append(name)
+        return neigh_index[name]
+
+    for chunk in pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        ages.append(_per_value(chunk["Age"], DEFAULT_AGE, _age_numeric, np.float64))
+        genders.append(_per_value(chunk["Gender"], "unknown", lambda g: g.lower() == "male", np.int8))
+        labels.append(_per_value(chunk["Substance"], "none", classify_overdose_risk, np.int8))
+        neigh_ids.append(_per_value(chunk["Neighbourhood"], "none", neigh_id, np.int32))
+        if with_incidents:
+            incidents.append(chunk[INCIDENT_COLUMN].fillna("").str.strip().to_numpy(dtype=str))
+
+    return FeatureColumns(np.concatenate(ages), np.concatenate(genders), np.concatenate(neigh_ids),
+                          np.concatenate(labels), neigh_names,
+                          np.concatenate(incidents) if with_incidents else None)
+
+
+def encode_matrix(age_numeric, gender_num, neigh_ids, neigh_names):
+    """
+    The CSR feature matrix (float32) and feature_cols for per-row columns
+    with parseable ages. Only neighbourhoods that occur get a column.
+    """
+    # pd.get_dummies orders dummy columns by sorted value and only emits seen neighbourhoods
+    seen = np.zeros(len(neigh_names), dtype=bool)
+    seen[neigh_ids] = True
+    order = sorted(np.flatnonzero(seen), key=neigh_names.__getitem__)
+    sorted_names = [neigh_names[i] for i in order]
+    column_of = np.full(len(neigh_names), -1, dtype=np.int32)
+    column_of[order] = np.arange(len(order))
+
+    # pd.cut(bins=AGE_BINS) intervals are (low, high]; ages outside every bin get no age column
+    age_group = np.searchsorted(AGE_BINS, age_numeric, side="left") - 1
+    in_bins = (age_numeric > AGE_BINS[0]) & (age_numeric <= AGE_BINS[-1])
+
+    n_rows = len(age_numeric)
+    rows = np.arange(n_rows)
+    age_offset = 2
+    neigh_offset = age_offset + len(AGE_LABELS)
+    blocks = [
+        (rows, np.zeros(n_rows, dtype=np.int32), age_numeric),
+        (rows, np.ones(n_rows, dtype=np.int32), gender_num),
+        (rows[in_bins], age_offset + age_group[in_bins], np.ones(in_bins.sum())),
+        (rows, neigh_offset + column_of[neigh_ids], np.ones(n_rows)),
+    ]
+    X = sp.csr_matrix(
+        (np.concatenate([b[2] for b in blocks]).astype(np.float32),
+         (np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks]))),
+        shape=(n_rows, neigh_offset + len(sorted_names)),
+    )
+    X.eliminate_zeros()
+
+    feature_cols = (["AgeNumeric", "GenderNum"] + [f"age_{label}" for label in AGE_LABELS]
+                    + [f"neigh_{name}" for name in sorted_names])
+    return X, feature_cols
+
+
+def build_training_matrix(csv_path, chunksize=250_000):
+    """The model's feature matrix (CSR, float32), labels and feature_cols for csv_path."""
+    columns = read_features(csv_path, chunksize)
+
+    # Rows whose age can't be parsed are dropped, as before
+    keep = ~np.isnan(columns.age_numeric)
+    age_numeric, gender_num = columns.age_numeric[keep], columns.gender_num[keep]
+    X, feature_cols = encode_matrix(age_numeric, gender_num, columns.neigh_ids[keep], columns.neigh_names)
+    return TrainingMatrix(X, columns.label[keep], feature_cols, age_numeric, gender_num)
@@ -2,7 +2,40 @@ import { useRef, useState, useEffect } from "react";
 import ReactMarkdown from "react-markdown";
 import { motion } from "framer-motion";
 
-const API_URL = `${import.meta.env.VITE_BACKEND}/predict_from_text`;
+const API_URL = `${import.meta.env.VITE_BACKEND}/predict_from_text_stream`;
+
+// Splits a server-sent-events buffer into complete { event, data } messages
+// and returns whatever trailing partial message is left over.
+const parseEvents = (buffer) => {
+	const blocks = buffer.split("\n\n");
+	const rest = blocks.pop();
+	const events = blocks.map((block) => {
+		let event = "message";
+		let data = "";
+		for (const line of block.split("\n")) {
+			if (line.startsWith("event:")) event = line.slice(6).trim();
+			else if (line.startsWith("data:")) data += line.slice(5).trim();
+		}
+		return { event, data: data ? JSON.parse(data) : {} };
+	});
+	return { events, rest };
+};
+
+const RISK_NAMES = { 0: "Low", 1: "Medium", 2: "High" };
+
+// One-line summary shown as soon as the prediction arrives, before the formatted answer
+const predictionSummary = (parsedData, prediction) => {
+	const probability = Math.round(prediction.overdose_probability * 100);
+	const risk = RISK_NAMES[prediction.overdose_class] ?? prediction.overdose_class;
+	const profile = parsedData
+		? [parsedData.Age, parsedData.Gender, parsedData.Neighborhood, parsedData.Substance]
+				.filter((value) => value && value !== "unknown")
+				.join(", ")
+		: "";
+	return `**Overdose probability: ${probability}%** · ${risk} risk · ${prediction.confidence} confidence${
+		profile ? ` (${profile})` : ""
+	}`;
+};
 
 const Home = () => {
 	const [chats, setChats] = useState([]);
@@ -22,6 +55,23 @@ const Home = () => {
 
 		setLoading(true);
 
+		// The reply is streamed in; it gets its own id so chunks can be appended to it
+		const replyId = Date.now();
+		let replyStarted = false;
+		const appendToReply = (text, replace = false) => {
+			if (!replyStarted) {
+				replyStarted = true;
+				setLoading(false);
+				setChats((prevChats) => [...prevChats, { sender: "api", id: replyId, message: text }]);
+				return;
+			}
+			setChats((prevChats) =>
+				prevChats.map((chat) =>
+					chat.id === replyId ? { ...chat, message: replace ? text : chat.message + text } : chat
+				)
+			);
+		};
+
 		try {
 			// Send the message to the API with 'text' as the key
 			const response = await fetch(API_URL, {
@@ -32,22 +82,38 @@ const Home = () => {
 				body: JSON.stringify({ text: message }), // Sending { text: message }
 			});
 
-			// Handle response from API
-			const data = await response.json();
-			console.log(data);
-
-			// Check if API response contains parsedData and prediction
-			if (data.formatted_output) {
-				const formattedText = data.formatted_output.parts[0].text;
-				setChats((prevChats) => [
-					...prevChats,
-					{
-						sender: "api",
-						message: formattedText,
-					},
-				]);
-			} else {
-				console.error("No parsedData in response");
+			if (!response.ok || !response.body) {
+				console.error("Error from API:", response.status);
+				return;
+			}
+
+			// Read server-sent events as they arrive
+			const reader = response.body.getReader();
+			const decoder = new TextDecoder();
+			let buffer = "";
+			let parsedData = null;
+			while (true) {
+				const { done, value } = await reader.read();
+				if (done) break;
+				buffer += decoder.decode(value, { stream: true });
+				const { events, rest } = parseEvents(buffer);
+				buffer = rest;
+				for (const { event, data } of events) {
+					if (event === "parsed_data") {
+						parsedData = data;
+					} else if (event === "prediction") {
+						// Shown right away; the formatted answer streams in below it
+						setChats((prevChats) => [
+							...prevChats,
+							{ sender: "api", message: predictionSummary(parsedData, data) },
+						]);
+					} else if (event === "delta") {
+						appendToReply(data.text);
+					} else if (event === "replace") {
+						// The server's local rendering replaces a partial LLM answer
+						appendToReply(data.text, true);
+					}
+				}
 			}
 		} catch (error) {
 			console.error("Error sending message:", error);